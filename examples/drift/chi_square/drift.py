@@ -21,9 +21,8 @@ def get_drift_metrics(_X, Y):
     # need at least 50 values in a batch.
     if len(Y) < 50:
         return gangplank.Drift()
-    buckets = [0] * 10
-    for y in Y:
-        buckets[y.argmax()] += 1
+    # Y is a read-only view of the predictions; count the classes without copying.
+    buckets = np.bincount(Y.argmax(axis=1), minlength=10)
     res = stats.chisquare(buckets)
     return gangplank.Drift(p_value=res.pvalue, test_statistic=res.statistic)
 
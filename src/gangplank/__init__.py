@@ -3,7 +3,14 @@ Please refer to the documentation provided in the README.md,
 which can be found at gangplank's PyPI URL: https://pypi.org/project/gangplank/
 """
 
-from .prometheus_model import Drift, PrometheusModel
+from .prometheus_model import (
+    Drift,
+    PrometheusModel,
+    # Represents histogram buckets for inference latencies in seconds
+    HISTOGRAM_LATENCY_BUCKETS,
+    # Represents histogram buckets for the number of samples per inference call
+    HISTOGRAM_BATCH_SIZE_BUCKETS,
+)
 from .train_test_exporter import (
     TrainTestExporter,
     # Represents histogram weight buckets in interval [-0.3, +0.3]
@@ -21,4 +28,6 @@ __all__ = [
     TrainTestExporter,
     HISTOGRAM_WEIGHT_BUCKETS_0_3,
     HISTOGRAM_WEIGHT_BUCKETS_1_0,
+    HISTOGRAM_LATENCY_BUCKETS,
+    HISTOGRAM_BATCH_SIZE_BUCKETS,
 ]
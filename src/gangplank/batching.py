@@ -0,0 +1,203 @@
+"""
+This module provides the BatchScheduler class that coalesces concurrent inference
+requests into batches so that a model can be run at its batch throughput even when
+callers submit only one or a few samples at a time.
+
+Classes:
+    BatchScheduler:
+        Queues the inputs of concurrent callers, runs a single prediction over a batch
+        of up to `max_batch_size` samples (or whatever has arrived after
+        `max_wait_ms`) and scatters the predictions back to the callers.
+
+Dependencies:
+    - numpy
+    - prometheus_client
+    - threading
+"""
+
+import collections
+import concurrent.futures
+import math
+import threading
+import time
+import typing
+
+import numpy as np
+import prometheus_client
+
+from . import families
+
+
+class _Request(typing.NamedTuple):
+    x: np.ndarray
+    size: int
+    future: concurrent.futures.Future
+    enqueued: float
+    trace_id: typing.Optional[str]
+
+
+class BatchScheduler:
+    """
+    Coalesces concurrent prediction requests into batches.
+
+    Args:
+        predict_func (Callable[[ndarray, str], ndarray]): A function that runs
+            inference on a batch of inputs and returns an array of predictions, one per
+            input. It is also passed the trace ID of the first traced request in the
+            batch, or None, so that the batch can be recorded as an exemplar.
+        max_batch_size (int): The maximum number of samples in a batch.
+        max_wait_ms (float, optional): The maximum time, in milliseconds, that a
+            request waits for other requests to fill a batch. Defaults to 5.0.
+        registry (prometheus_client.CollectorRegistry, optional): The Prometheus
+            registry to use for metrics. Defaults to prometheus_client.REGISTRY.
+        wait_buckets (list of float, optional): Histogram buckets for the time, in
+            seconds, that requests wait in the queue.
+        label_values (tuple of str, optional): The model name and version with which
+            to label the metrics; see gangplank.families.
+    """
+
+    def __init__(
+        self,
+        predict_func,
+        max_batch_size,
+        max_wait_ms=5.0,
+        registry=prometheus_client.REGISTRY,
+        wait_buckets=prometheus_client.Histogram.DEFAULT_BUCKETS,
+        label_values=None,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1.")
+        self.predict_func = predict_func
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = collections.deque()
+        self._queued_samples = 0
+        self._condition = threading.Condition()
+        self._closed = False
+
+        self.queue_depth = families.get_metric(
+            prometheus_client.Gauge,
+            "gangplank_predict_batching_queue_depth",
+            "The number of requests waiting to be batched",
+            registry,
+            label_values,
+            multiprocess_mode="livesum",
+        )
+        self.batch_size = families.get_metric(
+            prometheus_client.Histogram,
+            "gangplank_predict_batching_batch_size",
+            "The number of samples in the batches passed to the model",
+            registry,
+            label_values,
+            buckets=[2**i for i in range(math.ceil(math.log2(max_batch_size)) + 1)],
+        )
+        self.wait_time = families.get_metric(
+            prometheus_client.Histogram,
+            "gangplank_predict_batching_wait_seconds",
+            "The time that requests wait in the queue before inference starts",
+            registry,
+            label_values,
+            buckets=wait_buckets,
+        )
+
+        self._thread = threading.Thread(
+            target=self._run, name="gangplank-batcher", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, x, trace_id=None):
+        """
+        Queues inputs for inference.
+
+        Args:
+            x (ndarray): A batch of inputs; usually one or a few samples.
+            trace_id (str, optional): The trace ID of the request.
+
+        Returns:
+            concurrent.futures.Future: A future for the predictions for `x`.
+        """
+        x = np.asarray(x)
+        future = concurrent.futures.Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("cannot submit requests to a closed scheduler.")
+            self._queue.append(_Request(x, len(x), future, time.monotonic(), trace_id))
+            self._queued_samples += len(x)
+            self.queue_depth.inc()
+            self._condition.notify()
+        return future
+
+    def predict(self, x, trace_id=None):
+        """
+        Queues inputs for inference and waits for the predictions.
+
+        Args:
+            x (ndarray): A batch of inputs; usually one or a few samples.
+            trace_id (str, optional): The trace ID of the request.
+
+        Returns:
+            ndarray: The predictions for `x`.
+        """
+        return self.submit(x, trace_id).result()
+
+    def close(self):
+        """
+        Stops the scheduler once all queued requests have been processed.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _next_batch(self):
+        with self._condition:
+            self._condition.wait_for(lambda: self._queue or self._closed)
+            if not self._queue:
+                return None
+            # Wait for more requests until the batch is full or the oldest request
+            # has waited for max_wait.
+            deadline = self._queue[0].enqueued + self.max_wait
+            while self._queued_samples < self.max_batch_size and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            requests = [self._queue.popleft()]
+            size = requests[0].size
+            while self._queue and size + self._queue[0].size <= self.max_batch_size:
+                request = self._queue.popleft()
+                requests.append(request)
+                size += request.size
+            self._queued_samples -= size
+            self.queue_depth.dec(len(requests))
+            return requests
+
+    def _run(self):
+        while True:
+            requests = self._next_batch()
+            if requests is None:
+                return
+            now = time.monotonic()
+            for request in requests:
+                self.wait_time.observe(now - request.enqueued)
+
+            try:
+                if len(requests) == 1:
+                    x = requests[0].x
+                else:
+                    x = np.concatenate([request.x for request in requests])
+                self.batch_size.observe(len(x))
+                trace_id = next(
+                    (r.trace_id for r in requests if r.trace_id is not None), None
+                )
+                y = self.predict_func(x, trace_id)
+            except Exception as e:
+                for request in requests:
+                    request.future.set_exception(e)
+                continue
+
+            offset = 0
+            for request in requests:
+                request.future.set_result(y[offset : offset + request.size])
+                offset += request.size
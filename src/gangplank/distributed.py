@@ -0,0 +1,83 @@
+"""
+This module identifies the worker that a process is in a multi-worker training job so
+that, e.g., only the chief worker pushes job-wide metrics.
+
+The worker is identified from the `TF_CONFIG` environment variable (used by
+TensorFlow's multi-worker strategies), from JAX's multi-process runtime or from an
+initialized `torch.distributed` process group, in that order. A process that is not
+part of a multi-worker job is the chief of a job with a single worker.
+
+Classes:
+    WorkerInfo: The identity of a worker.
+
+Functions:
+    worker_info: Returns the identity of the current process's worker.
+
+Dependencies:
+    - keras
+"""
+
+import json
+import os
+import sys
+import typing
+
+import keras
+
+
+class WorkerInfo(typing.NamedTuple):
+    """
+    The identity of a worker in a training job.
+
+    Attributes:
+        worker (str): An ID that is unique within the job; e.g. the worker's rank.
+        is_chief (bool): True if the worker is responsible for job-wide metrics.
+        num_workers (int): The number of workers in the job.
+    """
+
+    worker: str
+    is_chief: bool
+    num_workers: int
+
+
+def _from_tf_config(tf_config):
+    config = json.loads(tf_config)
+    cluster = config.get("cluster", {})
+    task = config.get("task", {})
+    task_type = task.get("type", "worker")
+    index = int(task.get("index", 0))
+    has_chief = bool(cluster.get("chief"))
+    num_workers = len(cluster.get("chief", [])) + len(cluster.get("worker", []))
+    if task_type == "chief":
+        return WorkerInfo("0", True, num_workers)
+    if task_type == "worker":
+        rank = index + 1 if has_chief else index
+        return WorkerInfo(str(rank), rank == 0, num_workers)
+    # Parameter servers and evaluators don't train but are still distinguished.
+    return WorkerInfo(f"{task_type}-{index}", False, num_workers)
+
+
+def worker_info():
+    """
+    Returns the identity of the current process's worker.
+
+    Returns:
+        WorkerInfo: The worker's ID, whether it is the chief and the number of workers.
+    """
+    tf_config = os.environ.get("TF_CONFIG")
+    if tf_config:
+        return _from_tf_config(tf_config)
+    backend = keras.backend.backend()
+    if backend == "jax":
+        import jax
+
+        if jax.process_count() > 1:
+            rank = jax.process_index()
+            return WorkerInfo(str(rank), rank == 0, jax.process_count())
+    elif backend == "torch" and "torch.distributed" in sys.modules:
+        import torch.distributed as dist
+
+        if dist.is_available() and dist.is_initialized():
+            rank = dist.get_rank()
+            return WorkerInfo(str(rank), rank == 0, dist.get_world_size())
+    return WorkerInfo("0", True, 1)
@@ -0,0 +1,209 @@
+"""
+This module provides ready-made drift detectors that can be passed to PrometheusModel
+as the `get_drift_metrics_func` argument.
+
+Each detector keeps incremental sufficient statistics (class counts or quantile
+sketches) that are updated with vectorized NumPy operations as predictions arrive. Once
+a detector has seen `window_size` predictions, it tests the accumulated statistics
+against the expected distribution, returns a Drift with the result and starts a new
+window. Calls that don't complete a window return an empty Drift.
+
+Classes:
+    ChiSquareDrift:
+        A chi-square goodness-of-fit test of the predicted classes.
+    KSDrift:
+        A two-sample Kolmogorov-Smirnov test of prediction scores against reference
+        scores.
+    PSIDrift:
+        The population stability index of prediction scores against reference scores.
+
+Dependencies:
+    - numpy
+    - scipy
+"""
+
+import threading
+
+import numpy as np
+from scipy import stats
+
+from .prometheus_model import Drift
+from .sketch import QuantileSketch
+
+
+def _predicted_classes(y):
+    y = np.asarray(y)
+    if y.ndim > 1:
+        y = y.reshape(len(y), -1)
+        if y.shape[1] > 1:
+            return y.argmax(axis=1)
+        y = y[:, 0]
+    if np.issubdtype(y.dtype, np.floating):
+        # The score of a binary classifier with a single sigmoid output.
+        return (y > 0.5).astype(np.int64)
+    return y.astype(np.int64)
+
+
+def _max_scores(y):
+    y = np.asarray(y)
+    if y.ndim > 1:
+        return y.reshape(len(y), -1).max(axis=1)
+    return y
+
+
+class ChiSquareDrift:
+    """
+    Detects drift with a chi-square test of the frequencies of the predicted classes.
+
+    Args:
+        expected (array_like): The expected frequency (or probability) of each class.
+        window_size (int): The number of predictions per test. There should be at least
+            five expected predictions of each class per window.
+        alpha (float, optional): The significance level below which drift is reported.
+            Defaults to 0.05.
+
+    The predicted class is the argmax of each prediction. A prediction with a single
+    floating-point score (e.g. from a sigmoid output) is class 1 if the score is greater
+    than 0.5 and class 0 otherwise, and integer predictions are the classes themselves.
+    A ValueError is raised for a class without an expected frequency.
+    """
+
+    def __init__(self, expected, window_size, alpha=0.05):
+        expected = np.asarray(expected, dtype=np.float64)
+        self.expected = expected / expected.sum()
+        self.window_size = window_size
+        self.alpha = alpha
+        self.counts = np.zeros(len(expected), dtype=np.int64)
+        self._lock = threading.Lock()
+
+    def __call__(self, _x, y):
+        counts = np.bincount(_predicted_classes(y), minlength=len(self.counts))
+        if len(counts) > len(self.counts):
+            raise ValueError(
+                f"predicted class {len(counts) - 1} has no expected frequency; "
+                f"expected frequencies were given for {len(self.counts)} classes."
+            )
+        with self._lock:
+            self.counts += counts
+            total = self.counts.sum()
+            if total < self.window_size:
+                return Drift()
+            res = stats.chisquare(self.counts, f_exp=self.expected * total)
+            self.counts[:] = 0
+        return Drift(
+            drift_detected=int(res.pvalue < self.alpha),
+            p_value=float(res.pvalue),
+            test_statistic=float(res.statistic),
+        )
+
+
+class KSDrift:
+    """
+    Detects drift with a two-sample Kolmogorov-Smirnov test of prediction scores
+    against reference scores.
+
+    The observed and reference distributions are summarized by quantile sketches so
+    that memory use is constant; the test statistic is therefore accurate to the
+    sketches' relative accuracy.
+
+    Args:
+        reference (array_like): Reference scores; e.g. scores of the training data.
+        window_size (int): The number of predictions per test.
+        alpha (float, optional): The significance level below which drift is reported.
+            Defaults to 0.05.
+        score_func (Callable[[ndarray], ndarray], optional): A function that maps
+            predictions to one score per prediction. By default, the score is the
+            maximum of each prediction (i.e. the confidence of a classifier).
+        relative_accuracy (float, optional): The relative accuracy of the sketches.
+            Defaults to 0.01.
+    """
+
+    def __init__(
+        self,
+        reference,
+        window_size,
+        alpha=0.05,
+        score_func=None,
+        relative_accuracy=0.01,
+    ):
+        self.window_size = window_size
+        self.alpha = alpha
+        self.score_func = score_func or _max_scores
+        self.reference = QuantileSketch(relative_accuracy)
+        self.reference.update(reference)
+        self._reference_cdf = (
+            np.cumsum(self.reference.ordered_counts()) / self.reference.count
+        )
+        self.observed = QuantileSketch(relative_accuracy)
+        self._lock = threading.Lock()
+
+    def __call__(self, _x, y):
+        scores = self.score_func(y)
+        with self._lock:
+            self.observed.update(scores)
+            n = self.observed.count
+            if n < self.window_size:
+                return Drift()
+            cdf = np.cumsum(self.observed.ordered_counts()) / n
+            self.observed.clear()
+        statistic = float(np.abs(cdf - self._reference_cdf).max())
+        m = self.reference.count
+        p_value = float(stats.kstwo.sf(statistic, round(n * m / (n + m))))
+        return Drift(
+            drift_detected=int(p_value < self.alpha),
+            p_value=p_value,
+            test_statistic=statistic,
+        )
+
+
+class PSIDrift:
+    """
+    Detects drift with the population stability index (PSI) of prediction scores
+    against reference scores.
+
+    Args:
+        reference (array_like): Reference scores; e.g. scores of the training data.
+        window_size (int): The number of predictions per calculation.
+        n_bins (int, optional): The number of bins, at quantiles of the reference
+            scores. Defaults to 10.
+        threshold (float, optional): The PSI above which drift is reported. Defaults to
+            0.2.
+        score_func (Callable[[ndarray], ndarray], optional): A function that maps
+            predictions to one score per prediction. By default, the score is the
+            maximum of each prediction (i.e. the confidence of a classifier).
+    """
+
+    # Bins with no observations would make the PSI infinite.
+    _EPSILON = 1e-6
+
+    def __init__(
+        self, reference, window_size, n_bins=10, threshold=0.2, score_func=None
+    ):
+        self.window_size = window_size
+        self.threshold = threshold
+        self.score_func = score_func or _max_scores
+        reference = np.ravel(np.asarray(reference, dtype=np.float64))
+        edges = np.quantile(reference, np.linspace(0, 1, n_bins + 1)[1:-1])
+        self.edges = np.unique(edges)
+        expected = np.bincount(
+            np.searchsorted(self.edges, reference, side="right"),
+            minlength=len(self.edges) + 1,
+        )
+        self.expected = np.maximum(expected / expected.sum(), self._EPSILON)
+        self.counts = np.zeros(len(self.edges) + 1, dtype=np.int64)
+        self._lock = threading.Lock()
+
+    def __call__(self, _x, y):
+        bins = np.searchsorted(self.edges, np.ravel(self.score_func(y)), side="right")
+        counts = np.bincount(bins, minlength=len(self.counts))
+        with self._lock:
+            self.counts += counts
+            total = self.counts.sum()
+            if total < self.window_size:
+                return Drift()
+            observed = np.maximum(self.counts / total, self._EPSILON)
+            self.counts[:] = 0
+        psi = float(
+            np.sum((observed - self.expected) * np.log(observed / self.expected))
+        )
+        return Drift(drift_detected=int(psi > self.threshold), test_statistic=psi)
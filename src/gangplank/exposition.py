@@ -0,0 +1,245 @@
+"""
+This module provides an HTTP server that exposes the metrics of a Prometheus registry
+from a cached snapshot.
+
+prometheus_client's HTTP server collects and renders every metric on every scrape,
+which competes with inference for the GIL when a model is scraped by several Prometheus
+replicas. This server renders the registry at most once per `ttl` seconds, on a
+dedicated thread, and serves every scrape in that interval from the cached text (or
+its gzip-compressed form). Concurrent scrapes of a stale snapshot wait for a single
+collection. Scrapers that accept the OpenMetrics format (which, unlike the Prometheus
+text format, includes exemplars) are served a separately cached OpenMetrics snapshot.
+
+Classes:
+    ExpositionServer:
+        A threaded HTTP server that serves cached snapshots of a registry and reports
+        its own collection duration and cache hits and misses.
+
+Functions:
+    start_http_server: Starts an ExpositionServer on a background thread.
+
+Dependencies:
+    - prometheus_client
+    - threading
+"""
+
+import gzip
+import http.server
+import sys
+import threading
+import time
+import traceback
+import typing
+
+import prometheus_client
+from prometheus_client.openmetrics import exposition as openmetrics
+
+
+class _Snapshot(typing.NamedTuple):
+    created: float
+    text: bytes
+    compressed: bytes
+
+
+class _Format:
+    """
+    The cached snapshot of the registry in one exposition format.
+    """
+
+    def __init__(self, generate, content_type):
+        self.generate = generate
+        self.content_type = content_type
+        self.snapshot = None
+        self.error = None
+        self.generation = 0
+        self.requested = False
+        self.refreshing = False
+
+
+def _accepts_openmetrics(accept_header):
+    return any(
+        accepted.split(";")[0].strip() == "application/openmetrics-text"
+        for accepted in accept_header.split(",")
+    )
+
+
+class _HTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/favicon.ico":
+            self.send_response(200)
+            self.end_headers()
+            return
+        use_openmetrics = _accepts_openmetrics(self.headers.get("Accept", ""))
+        try:
+            snapshot, content_type = self.server.exposition.snapshot(use_openmetrics)
+        except Exception:
+            self.send_error(500, "error collecting metrics")
+            return
+        gzipped = "gzip" in self.headers.get("Accept-Encoding", "")
+        body = snapshot.compressed if gzipped else snapshot.text
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ExpositionServer:
+    """
+    Serves cached snapshots of a Prometheus registry over HTTP.
+
+    Args:
+        port (int): The port to listen on.
+        addr (str, optional): The address to listen on. Defaults to "0.0.0.0".
+        registry (prometheus_client.CollectorRegistry, optional): The registry to
+            expose. Defaults to prometheus_client.REGISTRY.
+        ttl (float, optional): The time, in seconds, for which a snapshot is served
+            before the registry is collected again. Defaults to 1.0.
+
+    The server registers two metrics in the registry that it exposes:
+    `gangplank_scrape_collect_seconds`, a histogram of the time to collect and render
+    the registry, and `gangplank_scrape_requests_total`, a count of the requests served
+    from the cache (`cache="hit"`) or after a collection (`cache="miss"`).
+    """
+
+    def __init__(
+        self, port, addr="0.0.0.0", registry=prometheus_client.REGISTRY, ttl=1.0
+    ):
+        self.registry = registry
+        self.ttl = ttl
+        self._condition = threading.Condition()
+        self._text = _Format(
+            prometheus_client.generate_latest, prometheus_client.CONTENT_TYPE_LATEST
+        )
+        self._openmetrics = _Format(
+            openmetrics.generate_latest, openmetrics.CONTENT_TYPE_LATEST
+        )
+        self._closed = False
+
+        self.collect_time = prometheus_client.Histogram(
+            "gangplank_scrape_collect_seconds",
+            "The time to collect and render the metrics for a scrape",
+            registry=registry,
+        )
+        requests = prometheus_client.Counter(
+            "gangplank_scrape_requests_total",
+            "The number of scrape requests",
+            labelnames=("cache",),
+            registry=registry,
+        )
+        self._hits = requests.labels("hit")
+        self._misses = requests.labels("miss")
+
+        self._collector = threading.Thread(
+            target=self._run, name="gangplank-exposition", daemon=True
+        )
+        self._collector.start()
+        self._httpd = _HTTPServer((addr, port), _Handler)
+        self._httpd.exposition = self
+        self.port = self._httpd.server_address[1]
+        self._server = threading.Thread(
+            target=self._httpd.serve_forever, name="gangplank-http", daemon=True
+        )
+        self._server.start()
+
+    def snapshot(self, openmetrics=False):
+        """
+        Returns a snapshot of the registry that is no older than the TTL, waiting for
+        the registry to be collected if necessary.
+
+        Args:
+            openmetrics (bool, optional): If True, the snapshot is in the OpenMetrics
+                format; otherwise, it is in the Prometheus text format. Defaults to
+                False.
+
+        Returns:
+            tuple: The snapshot and its content type.
+        """
+        fmt = self._openmetrics if openmetrics else self._text
+        with self._condition:
+            snapshot = fmt.snapshot
+            if snapshot is not None and time.monotonic() - snapshot.created < self.ttl:
+                self._hits.inc()
+                return snapshot, fmt.content_type
+            self._misses.inc()
+            generation = fmt.generation
+            if not fmt.refreshing:
+                fmt.requested = True
+                self._condition.notify_all()
+            self._condition.wait_for(
+                lambda: fmt.generation != generation or self._closed
+            )
+            if fmt.error is not None:
+                raise fmt.error
+            if fmt.snapshot is None:
+                raise RuntimeError("the exposition server is closed.")
+            return fmt.snapshot, fmt.content_type
+
+    def close(self):
+        """
+        Stops serving requests.
+        """
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._collector.join()
+
+    def _run(self):
+        formats = (self._text, self._openmetrics)
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._closed or any(fmt.requested for fmt in formats)
+                )
+                if self._closed:
+                    return
+                fmt = next(fmt for fmt in formats if fmt.requested)
+                fmt.requested = False
+                fmt.refreshing = True
+            created = time.monotonic()
+            snapshot = error = None
+            try:
+                text = fmt.generate(self.registry)
+                snapshot = _Snapshot(created, text, gzip.compress(text, 1))
+            except Exception as e:
+                traceback.print_exc(file=sys.stderr)
+                error = e
+            self.collect_time.observe(time.monotonic() - created)
+            with self._condition:
+                if snapshot is not None:
+                    fmt.snapshot = snapshot
+                fmt.error = error
+                fmt.refreshing = False
+                fmt.generation += 1
+                self._condition.notify_all()
+
+
+def start_http_server(
+    port, addr="0.0.0.0", registry=prometheus_client.REGISTRY, ttl=1.0
+):
+    """
+    Starts an HTTP server that exposes cached snapshots of a registry.
+
+    Args:
+        port (int): The port to listen on.
+        addr (str, optional): The address to listen on. Defaults to "0.0.0.0".
+        registry (prometheus_client.CollectorRegistry, optional): The registry to
+            expose. Defaults to prometheus_client.REGISTRY.
+        ttl (float, optional): The time, in seconds, for which a snapshot is served.
+            Defaults to 1.0.
+
+    Returns:
+        ExpositionServer: The server; call `close` to stop it.
+    """
+    return ExpositionServer(port, addr, registry, ttl)
@@ -0,0 +1,193 @@
+"""
+This module shares metric families between the PrometheusModel instances that serve
+different models from one registry.
+
+When a model is given a name, its metrics are children, labelled with the model's name
+and version, of metric families that are created once per registry. The children are
+bound when the model is wrapped so that recording a metric doesn't look up labels.
+Custom collectors (e.g. for the fast path) are merged into one collector per registry
+that adds the labels at scrape time. Since the models share families, every named model
+in a registry must be created with the same metric options.
+
+Functions:
+    register_model: Reserves a model name and version in a registry.
+    unregister_model: Removes a model's metrics from a registry's shared families and
+        releases its name and version.
+    get_metric: Returns a metric or, for a named model, the model's child of a shared
+        metric family.
+    register_collector: Registers a custom collector or, for a named model, adds it
+        to a shared labelling collector.
+
+Dependencies:
+    - prometheus_client
+    - threading
+"""
+
+import threading
+import weakref
+
+from prometheus_client.metrics_core import Metric
+
+# The names of the labels that identify a model.
+LABEL_NAMES = ("model", "version")
+
+
+class _RegistryState:
+    def __init__(self):
+        self.models = set()
+        self.options = None
+        self.families = {}
+        self.collectors = {}
+
+
+_lock = threading.Lock()
+_registries = weakref.WeakKeyDictionary()
+
+
+def _state(registry):
+    # Must be called with the lock held.
+    state = _registries.get(registry)
+    if state is None:
+        state = _registries[registry] = _RegistryState()
+    return state
+
+
+def register_model(registry, label_values, options=None):
+    """
+    Reserves a model name and version in a registry.
+
+    Args:
+        registry (prometheus_client.CollectorRegistry): The registry.
+        label_values (tuple of str): The model's name and version.
+        options (dict, optional): The options that determine the model's metric
+            families; e.g. whether it uses the fast path and its buckets. Models with
+            different options would export the same metric names from different
+            families, which is an invalid exposition.
+
+    Raises:
+        ValueError: If the model name and version are already registered or if the
+            options differ from those of the first model registered.
+    """
+    with _lock:
+        state = _state(registry)
+        if label_values in state.models:
+            raise ValueError(
+                f"model {label_values[0]!r} version {label_values[1]!r} is already "
+                "registered."
+            )
+        if state.options is None:
+            state.options = options
+        elif options != state.options:
+            raise ValueError(
+                f"model {label_values[0]!r} version {label_values[1]!r} has metric "
+                f"options {options!r} but the registry's models have "
+                f"{state.options!r}."
+            )
+        state.models.add(label_values)
+
+
+def unregister_model(registry, label_values):
+    """
+    Removes a model's children from a registry's shared metric families and labelling
+    collectors and releases its name and version so that they can be registered again.
+
+    Args:
+        registry (prometheus_client.CollectorRegistry): The registry.
+        label_values (tuple of str): The model's name and version.
+    """
+    with _lock:
+        state = _state(registry)
+        state.models.discard(label_values)
+        for family in state.families.values():
+            try:
+                family.remove(*label_values)
+            except KeyError:
+                pass
+        for shared in state.collectors.values():
+            shared.children = [
+                child for child in shared.children if child[0] != label_values
+            ]
+
+
+def get_metric(
+    metric_class, name, documentation, registry, label_values=None, **kwargs
+):
+    """
+    Returns a metric for a model.
+
+    Args:
+        metric_class: The metric class; e.g. prometheus_client.Counter.
+        name (str): The name of the metric.
+        documentation (str): The description of the metric.
+        registry (prometheus_client.CollectorRegistry): The registry.
+        label_values (tuple of str, optional): The model's name and version. If None,
+            an unlabelled metric is created; otherwise, the model's child of a metric
+            family that is shared by all models in the registry is returned.
+        kwargs: Other arguments for the metric class; e.g. buckets.
+    """
+    if label_values is None:
+        return metric_class(name, documentation, registry=registry, **kwargs)
+    with _lock:
+        families = _state(registry).families
+        family = families.get(name)
+        if family is None:
+            family = families[name] = metric_class(
+                name,
+                documentation,
+                labelnames=LABEL_NAMES,
+                registry=registry,
+                **kwargs,
+            )
+    return family.labels(*label_values)
+
+
+class _LabellingCollector:
+    """
+    Merges the metrics of the custom collectors of many models, adding the models'
+    labels to every sample.
+    """
+
+    def __init__(self):
+        self.children = []
+
+    def collect(self):
+        families = {}
+        for label_values, collector in list(self.children):
+            labels = dict(zip(LABEL_NAMES, label_values))
+            for family in collector.collect():
+                merged = families.get(family.name)
+                if merged is None:
+                    merged = families[family.name] = Metric(
+                        family.name, family.documentation, family.type, family.unit
+                    )
+                for sample in family.samples:
+                    merged.samples.append(
+                        sample._replace(labels={**labels, **sample.labels})
+                    )
+        return families.values()
+
+
+def register_collector(registry, kind, collector, label_values=None):
+    """
+    Registers a custom collector for a model.
+
+    Args:
+        registry (prometheus_client.CollectorRegistry): The registry.
+        kind (str): Identifies the collector's metrics; collectors of the same kind
+            export the same metric names.
+        collector: The collector.
+        label_values (tuple of str, optional): The model's name and version. If None,
+            the collector is registered directly.
+    """
+    if label_values is None:
+        registry.register(collector)
+        return
+    with _lock:
+        collectors = _state(registry).collectors
+        shared = collectors.get(kind)
+        is_new = shared is None
+        if is_new:
+            shared = collectors[kind] = _LabellingCollector()
+        shared.children.append((label_values, collector))
+    if is_new:
+        registry.register(shared)
@@ -0,0 +1,364 @@
+"""
+This module computes per-layer training statistics on the device that trains the model.
+
+Every statistic is a reduction computed with `keras.ops` (or the backend's automatic
+differentiation, for gradients) and all of the statistics are stacked into a single
+tensor so that only a few scalars per layer are copied to the host, once per
+computation, rather than every weight.
+
+Classes:
+    LayerStatistics:
+        Computes, for each selected layer, the norm of the layer's weights, the ratio
+        of the norm of the weights' change since the last computation to the norm of
+        the previous weights and, given a probe batch, the norm of the loss gradients
+        of the layer's weights and, for layers with a ReLU activation, the fraction of
+        units that are inactive for every sample in the batch.
+    LayerHistograms:
+        A Prometheus collector of per-layer histograms of weights, with buckets that
+        adapt to each layer's range. The weights of large layers can be subsampled on
+        the device, from each weight tensor in place, so that the cost of a histogram
+        doesn't grow with the layer.
+
+Functions:
+    check_gradient_backend: Checks that gradient statistics can be computed with the
+        Keras backend.
+
+Dependencies:
+    - keras
+    - numpy
+    - prometheus_client
+"""
+
+import math
+import re
+import sys
+import threading
+
+import keras
+import numpy as np
+from keras import ops
+from prometheus_client.core import HistogramMetricFamily
+from prometheus_client.utils import floatToGoString
+
+# The names of the statistics, in the order of the values returned by `compute`.
+WEIGHT_NORM = "weight_norm"
+UPDATE_RATIO = "update_ratio"
+GRADIENT_NORM = "gradient_norm"
+DEAD_RELU_FRACTION = "dead_relu_fraction"
+
+# The Keras backends for which loss gradients can be computed.
+_GRADIENT_BACKENDS = ("jax", "tensorflow", "torch")
+
+
+def check_gradient_backend():
+    """
+    Raises NotImplementedError if gradient statistics aren't supported for the Keras
+    backend.
+    """
+    backend = keras.backend.backend()
+    if backend not in _GRADIENT_BACKENDS:
+        raise NotImplementedError(
+            f"gradient statistics aren't supported for the {backend} backend."
+        )
+
+
+def _is_relu(layer):
+    if isinstance(layer, keras.layers.ReLU):
+        return True
+    activation = getattr(layer, "activation", None)
+    return activation is keras.activations.relu
+
+
+def _select_layers(model, layer_filter):
+    if layer_filter is None:
+        return list(model.layers)
+    if isinstance(layer_filter, str):
+        pattern = re.compile(layer_filter)
+
+        def layer_filter(layer):
+            return pattern.search(layer.name) is not None
+
+    return [layer for layer in model.layers if layer_filter(layer)]
+
+
+def _squared_norm(tensors):
+    total = None
+    for t in tensors:
+        s = ops.sum(ops.square(ops.cast(t, "float32")))
+        total = s if total is None else total + s
+    return total
+
+
+class LayerStatistics:
+    """
+    Computes per-layer weight, update, gradient and activation statistics on-device.
+
+    Args:
+        model (keras.Model): The model being trained.
+        layer_filter (str or Callable[[keras.layers.Layer], bool], optional): Selects
+            the layers for which statistics are computed: either a regular expression
+            that is searched for in the layer names or a predicate. By default, every
+            layer is selected.
+        data (tuple, optional): A probe batch `(x, y)` for which the gradient norms and
+            dead-ReLU fractions are computed. If None, only the weight norms and update
+            ratios are computed.
+
+    To compute update ratios, a copy of the weights of the selected layers is kept on
+    the device between computations.
+    """
+
+    def __init__(self, model, layer_filter=None, data=None):
+        self.model = model
+        self.data = data
+        layers = _select_layers(model, layer_filter)
+        self.weighted_layers = [layer for layer in layers if layer.trainable_weights]
+        self.relu_layers = []
+        self._activations_model = None
+        if data is not None:
+            self.relu_layers = [layer for layer in layers if _is_relu(layer)]
+            if self.relu_layers:
+                try:
+                    # A Sequential model that has only been fit has `inputs` but no
+                    # `input`. A single input is passed unwrapped, as the model's
+                    # own inputs are.
+                    inputs = model.inputs
+                    self._activations_model = keras.Model(
+                        inputs[0] if len(inputs) == 1 else inputs,
+                        [layer.output for layer in self.relu_layers],
+                    )
+                except (AttributeError, ValueError):
+                    # Subclassed models don't have a graph of layer outputs.
+                    print(
+                        "gangplank: can't compute dead-ReLU fractions for a model "
+                        "without symbolic layer outputs.",
+                        file=sys.stderr,
+                    )
+                    self.relu_layers = []
+        self._previous_weights = None
+
+    def _gradients(self, variables):
+        x, y = self.data
+        loss_func = keras.losses.get(self.model.loss)
+        backend = keras.backend.backend()
+        if backend == "jax":
+            import jax
+
+            trainable = [v.value for v in self.model.trainable_variables]
+            non_trainable = [v.value for v in self.model.non_trainable_variables]
+            positions = {id(v): i for i, v in enumerate(self.model.trainable_variables)}
+
+            def loss(values):
+                y_pred, _ = self.model.stateless_call(values, non_trainable, x)
+                return ops.mean(loss_func(y, y_pred))
+
+            grads = jax.grad(loss)(trainable)
+            return [grads[positions[id(v)]] for v in variables]
+        if backend == "tensorflow":
+            import tensorflow as tf
+
+            with tf.GradientTape() as tape:
+                loss = ops.mean(loss_func(y, self.model(x, training=False)))
+            return tape.gradient(loss, [v.value for v in variables])
+        if backend == "torch":
+            self.model.zero_grad()
+            loss = ops.mean(loss_func(y, self.model(x, training=False)))
+            loss.backward()
+            grads = [v.value.grad for v in variables]
+            self.model.zero_grad()
+            return grads
+        check_gradient_backend()
+
+    def names(self):
+        """
+        Returns the `(layer name, statistic)` pairs in the order of the values
+        returned by `compute`.
+        """
+        names = [(layer.name, WEIGHT_NORM) for layer in self.weighted_layers]
+        names += [(layer.name, UPDATE_RATIO) for layer in self.weighted_layers]
+        if self.data is not None:
+            names += [(layer.name, GRADIENT_NORM) for layer in self.weighted_layers]
+            names += [(layer.name, DEAD_RELU_FRACTION) for layer in self.relu_layers]
+        return names
+
+    def compute(self):
+        """
+        Computes the statistics and copies them to the host in a single transfer.
+
+        Returns:
+            list of (str, str, float): The layer name, the statistic and its value.
+            The update ratios are NaN for the first computation.
+        """
+        values = []
+        current_weights = []
+        for layer in self.weighted_layers:
+            weights = [ops.copy(w.value) for w in layer.trainable_weights]
+            current_weights.append(weights)
+            values.append(ops.sqrt(_squared_norm(weights)))
+        for i, weights in enumerate(current_weights):
+            if self._previous_weights is None:
+                values.append(ops.convert_to_tensor(float("nan")))
+                continue
+            previous = self._previous_weights[i]
+            change = _squared_norm(
+                ops.subtract(w, p) for w, p in zip(weights, previous)
+            )
+            values.append(ops.sqrt(change / _squared_norm(previous)))
+        self._previous_weights = current_weights
+
+        if self.data is not None:
+            variables = [
+                w for layer in self.weighted_layers for w in layer.trainable_weights
+            ]
+            grads = iter(self._gradients(variables))
+            for layer in self.weighted_layers:
+                layer_grads = [next(grads) for _ in layer.trainable_weights]
+                values.append(ops.sqrt(_squared_norm(layer_grads)))
+            if self._activations_model is not None:
+                activations = self._activations_model(self.data[0], training=False)
+                if len(self.relu_layers) == 1:
+                    activations = [activations]
+                for a in activations:
+                    # A unit (the last axis) is dead if it isn't active for any sample
+                    # or position.
+                    a = ops.reshape(a, (-1, a.shape[-1]))
+                    dead = ops.all(ops.less_equal(a, 0), axis=0)
+                    values.append(ops.mean(ops.cast(dead, "float32")))
+
+        if not values:
+            return []
+        host_values = ops.convert_to_numpy(
+            ops.stack([ops.cast(v, "float32") for v in values])
+        )
+        return [
+            (layer, statistic, float(value))
+            for (layer, statistic), value in zip(self.names(), host_values)
+        ]
+
+
+def _nice_ceiling(x):
+    """
+    Rounds a positive number up to 1, 2 or 5 times a power of ten so that bucket bounds
+    only change when a layer's range changes substantially.
+    """
+    exponent = math.floor(math.log10(x))
+    for mantissa in (1, 2, 5, 10):
+        bound = mantissa * 10.0**exponent
+        if bound >= x:
+            return bound
+    return 10.0 ** (exponent + 1)
+
+
+class LayerHistograms:
+    """
+    Collects histograms, labelled by layer, of the weights of selected layers.
+
+    The buckets of a layer's histogram evenly divide the interval [-r, r], where r is
+    the layer's largest absolute weight rounded up to 1, 2 or 5 times a power of ten.
+
+    Args:
+        model (keras.Model): The model.
+        layer_filter (str or Callable[[keras.layers.Layer], bool], optional): Selects
+            the layers, as for LayerStatistics. By default, every layer with trainable
+            weights is selected.
+        n_buckets (int, optional): The number of buckets per histogram. Defaults to 20.
+        sample_size (int, optional): If given, the histogram of a layer with more
+            weights than this is computed from a uniform sample of `sample_size`
+            weights, which is taken on the device. The sample is chosen once, with a
+            fixed seed, so the same weights are tracked from one histogram to the next.
+        seed (int, optional): The seed for choosing the samples. Defaults to 0.
+
+    When a layer is sampled, its histogram counts are those of the sample.
+    """
+
+    def __init__(
+        self, model, layer_filter=None, n_buckets=20, sample_size=None, seed=0
+    ):
+        self.model = model
+        self.n_buckets = n_buckets
+        self.sample_size = sample_size
+        self.layers = [
+            layer
+            for layer in _select_layers(model, layer_filter)
+            if layer.trainable_weights
+        ]
+        # The sampled positions of each of a layer's weight tensors, or None if the
+        # layer isn't sampled, so that the sample is gathered from each tensor without
+        # first flattening the layer's weights into one array.
+        self._indices = []
+        for i, layer in enumerate(self.layers):
+            sizes = [math.prod(w.shape) for w in layer.trainable_weights]
+            indices = None
+            if sample_size is not None and sum(sizes) > sample_size:
+                rng = np.random.default_rng([seed, i])
+                sample = np.sort(rng.choice(sum(sizes), sample_size, replace=False))
+                offsets = np.cumsum([0] + sizes)
+                indices = [
+                    sample[(sample >= start) & (sample < end)] - start
+                    for start, end in zip(offsets[:-1], offsets[1:])
+                ]
+            self._indices.append(indices)
+        self._histograms = []
+        self._lock = threading.Lock()
+
+    def _bounds(self, r):
+        # The upper bounds of the buckets, -r + 2r/n, ..., r, are rounded so that
+        # floating-point error doesn't show in their labels.
+        n = self.n_buckets
+        bounds = r * np.arange(2 - n, n + 1, 2) / n
+        return np.round(bounds, 12 - math.floor(math.log10(r)))
+
+    def update(self):
+        """
+        Recomputes the histograms from the current weights, copying the weights (or
+        the samples) of all the layers to the host in a single transfer.
+        """
+        if not self.layers:
+            return
+        values = []
+        sizes = []
+        for layer, indices in zip(self.layers, self._indices):
+            size = 0
+            for j, w in enumerate(layer.trainable_weights):
+                if indices is None:
+                    flat = ops.reshape(w.value, (-1,))
+                elif len(indices[j]):
+                    flat = ops.take(w.value, indices[j])
+                else:
+                    continue
+                values.append(ops.cast(flat, "float32"))
+                size += flat.shape[0]
+            sizes.append(size)
+        host_values = ops.convert_to_numpy(ops.concatenate(values))
+
+        histograms = []
+        start = 0
+        for layer, size in zip(self.layers, sizes):
+            weights = host_values[start : start + size]
+            start += size
+            max_abs = float(np.nanmax(np.abs(weights))) if weights.size else 0.0
+            r = _nice_ceiling(max_abs) if max_abs > 0 else 1.0
+            bounds = self._bounds(r)
+            counts = np.bincount(
+                np.searchsorted(bounds, weights, side="left"),
+                minlength=len(bounds) + 1,
+            )
+            cumulative = np.cumsum(counts)
+            buckets = [(floatToGoString(b), int(c)) for b, c in zip(bounds, cumulative)]
+            buckets[-1] = ("+Inf", int(cumulative[-1]))
+            histograms.append((layer.name, buckets, float(weights.sum())))
+        with self._lock:
+            self._histograms = histograms
+
+    def collect(self):
+        with self._lock:
+            histograms = self._histograms
+        if not histograms:
+            return
+        family = HistogramMetricFamily(
+            "gangplank_train_layer_weights",
+            "The weights of a layer",
+            labels=["layer"],
+        )
+        for name, buckets, sum_value in histograms:
+            family.add_metric([name], buckets, sum_value)
+        yield family
@@ -0,0 +1,73 @@
+"""
+This module supports exposing PrometheusModel metrics from pre-fork servers, like
+gunicorn, in which a model is served by many worker processes.
+
+Multiprocess mode is enabled by setting the PROMETHEUS_MULTIPROC_DIR environment
+variable to an empty directory before the server starts. Each worker then stores its
+metric values in memory-mapped files in that directory and a single HTTP endpoint,
+started in the server's master process, aggregates the values of all workers when
+scraped. For example, in a gunicorn configuration file:
+
+    import gangplank.multiprocess
+
+    def when_ready(server):
+        gangplank.multiprocess.start_http_server(8561)
+
+    child_exit = gangplank.multiprocess.child_exit
+
+Functions:
+    is_enabled: Returns True if multiprocess mode is enabled.
+    start_http_server: Starts an HTTP server that exposes the aggregated metrics of
+        all worker processes.
+    child_exit: A gunicorn `child_exit` hook that discards the live gauges of a
+        worker that has exited.
+
+Dependencies:
+    - prometheus_client
+"""
+
+import os
+
+import prometheus_client
+from prometheus_client import multiprocess
+
+
+def is_enabled():
+    """
+    Returns True if metrics are stored for multiprocess aggregation; i.e. if the
+    PROMETHEUS_MULTIPROC_DIR environment variable is set.
+    """
+    return (
+        "PROMETHEUS_MULTIPROC_DIR" in os.environ
+        or "prometheus_multiproc_dir" in os.environ
+    )
+
+
+def start_http_server(port, addr="0.0.0.0"):
+    """
+    Starts an HTTP server that exposes the metrics of all processes. This should be
+    called once, e.g. from the master process of a pre-fork server.
+
+    Args:
+        port (int): The port to listen on.
+        addr (str, optional): The address to listen on. Defaults to "0.0.0.0".
+
+    Returns:
+        prometheus_client.CollectorRegistry: The registry that aggregates the metrics.
+    """
+    if not is_enabled():
+        raise RuntimeError(
+            "the PROMETHEUS_MULTIPROC_DIR environment variable is unset."
+        )
+    registry = prometheus_client.CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    prometheus_client.start_http_server(port, addr, registry=registry)
+    return registry
+
+
+def child_exit(server, worker):
+    """
+    A gunicorn `child_exit` server hook that removes the live gauges (e.g. in-flight
+    requests) of a worker process that has exited.
+    """
+    multiprocess.mark_process_dead(worker.pid)
@@ -3,22 +3,53 @@ This module provides the PrometheusModel class, a proxy for a Keras machine lear
 model that enables automatic collection and exposition of Prometheus metrics of
 inference operations. It tracks the number of predictions and model calls, as well as
 the time spent performing these operations. Optionally, it can start a Prometheus HTTP
-server for metrics exposition.
+server for metrics exposition. When the PROMETHEUS_MULTIPROC_DIR environment variable
+is set, metrics are stored so that they can be aggregated across processes; see the
+gangplank.multiprocess module. Models that are given a name share metric families,
+labelled by model name and version, so that many models can be served from one
+registry; see the gangplank.families module.
 
 Classes:
     - Drift: A class that measures drift between observed data and the expected data
         distribution.
     - PrometheusModel: Proxies a Keras model to monitor prediction and call metrics
-        for storing in Prometheus.
+        for storing in Prometheus. Optionally, concurrent predictions can be coalesced
+        into batches.
 
 Dependencies:
+    - asyncio
+    - numpy
     - prometheus_client
+    - threading
     - time
 """
 
+import asyncio
+import atexit
+import bisect
+import collections
+import functools
+import sys
 import typing
 import prometheus_client
+import threading
 import time
+import traceback
+import weakref
+
+import keras
+import numpy as np
+from prometheus_client.core import (
+    CounterMetricFamily,
+    HistogramMetricFamily,
+    SummaryMetricFamily,
+)
+from prometheus_client.samples import Exemplar, Sample
+from prometheus_client.utils import floatToGoString
+
+from . import exposition, families, multiprocess, pushgateway
+from .batching import BatchScheduler
+from .sketch import QuantileSketch
 
 
 class Drift(typing.NamedTuple):
@@ -37,13 +68,750 @@ class Drift(typing.NamedTuple):
     test_statistic: float = None
 
 
+# Histogram buckets for inference latencies, in seconds.
+HISTOGRAM_LATENCY_BUCKETS = [
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+]
+
+# Histogram buckets for the number of samples per inference call.
+HISTOGRAM_BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024]
+
+# The names and descriptions of the metrics of the instrumented methods.
+_PREDICT_METRICS = (
+    "gangplank_predict",
+    "The number of model predictions",
+    "The amount of time spent in the predict method",
+    "The latency of calls to the predict method",
+    "The number of samples passed to the predict method",
+)
+_CALL_METRICS = (
+    "gangplank_predict_call",
+    "The number of __call__ invocations",
+    "The amount of time spent in the __call__ method",
+    "The latency of __call__ invocations",
+    "The number of samples passed to the __call__ method",
+)
+
+
+# The Keras inference methods, other than predict and __call__, that are instrumented
+# and where their samples are counted: in their outputs, their first input or, for the
+# train step methods, their `data` argument (which JAX passes after the model state).
+_INSTRUMENTED_METHODS = (
+    ("predict_on_batch", "outputs"),
+    ("predict_step", "outputs"),
+    ("evaluate", "inputs"),
+    ("test_on_batch", "inputs"),
+    ("test_step", "data"),
+)
+
+
+def _method_metrics(method_name):
+    return (
+        "gangplank_" + method_name,
+        f"The number of samples passed to the {method_name} method",
+        f"The amount of time spent in the {method_name} method",
+        f"The latency of calls to the {method_name} method",
+        f"The number of samples per call to the {method_name} method",
+    )
+
+
+def _num_samples(y):
+    """
+    Returns the number of samples in a model's output (or input) from its shape,
+    without converting it; for several outputs, the first output is counted. Returns
+    None if the number of samples is unknown; e.g. for a dataset.
+    """
+    while isinstance(y, (list, tuple, dict)):
+        if not y:
+            return 0
+        y = next(iter(y.values())) if isinstance(y, dict) else y[0]
+    shape = getattr(y, "shape", None)
+    if shape:
+        return None if shape[0] is None else int(shape[0])
+    # Datasets (a PyDataset, a tf.data.Dataset or a generator) have no shape and the
+    # length of those that have one is the number of batches, not of samples.
+    return None
+
+
+def _counted(count_from, res, args, kwds):
+    if count_from == "outputs":
+        return res
+    if count_from == "data":
+        return kwds["data"] if "data" in kwds else args[-1]
+    return kwds["x"] if "x" in kwds else args[0]
+
+
+class _LazyMetrics:
+    """
+    Creates the metrics of an instrumented method on the method's first call so that
+    methods that are never called don't add to the cost of every scrape.
+    """
+
+    def __init__(self, create):
+        self._create = create
+        self._metrics = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        metrics = self._metrics
+        if metrics is None:
+            with self._lock:
+                if self._metrics is None:
+                    self._metrics = self._create()
+                metrics = self._metrics
+        return metrics
+
+
+def _readonly_view(a):
+    """
+    Returns a read-only, C-contiguous NumPy view of an array or backend tensor (or of
+    each array of a list, tuple or dict) for passing to drift and profiling hooks.
+
+    NumPy arrays and CPU tensors that are already contiguous are not copied. Inputs
+    that aren't arrays, e.g. datasets, are returned unchanged.
+    """
+    if isinstance(a, (list, tuple)):
+        return type(a)(_readonly_view(v) for v in a)
+    if isinstance(a, dict):
+        return {k: _readonly_view(v) for k, v in a.items()}
+    if not isinstance(a, np.ndarray):
+        if not hasattr(a, "shape"):
+            return a
+        a = keras.ops.convert_to_numpy(a)
+    view = np.ascontiguousarray(a).view()
+    view.flags.writeable = False
+    return view
+
+
+def _readonly_copy(a):
+    """
+    Returns a read-only, C-contiguous NumPy copy of an array or backend tensor (or of
+    each array of a list, tuple or dict) for hooks that run after `predict` returns,
+    when the caller may already be reusing its buffers.
+    """
+    if isinstance(a, (list, tuple)):
+        return type(a)(_readonly_copy(v) for v in a)
+    if isinstance(a, dict):
+        return {k: _readonly_copy(v) for k, v in a.items()}
+    if not isinstance(a, np.ndarray):
+        if not hasattr(a, "shape"):
+            return a
+        a = keras.ops.convert_to_numpy(a)
+    copy = np.array(a, order="C")
+    copy.flags.writeable = False
+    return copy
+
+
+def _upper_bounds(buckets):
+    bounds = [float(b) for b in buckets]
+    if bounds[-1] != float("inf"):
+        bounds.append(float("inf"))
+    return bounds
+
+
+class _ThreadToken:
+    __slots__ = ("__weakref__",)
+
+
+class _ThreadLocalStats:
+    """
+    Counts, durations and, optionally, histogram buckets accumulated in per-thread
+    slots.
+
+    Each thread only ever updates its own slot so no lock is taken when recording; the
+    slots are summed when the metrics are collected. When a thread exits, its slot is
+    added to a retired total so that the number of slots is bounded by the number of
+    live threads, even in thread-per-request servers.
+    """
+
+    def __init__(self, latency_buckets=None, batch_size_buckets=None):
+        self.latency_bounds = None
+        self.batch_size_bounds = None
+        if latency_buckets:
+            self.latency_bounds = _upper_bounds(latency_buckets)
+            self._latency_bounds_ns = [b * 1e9 for b in self.latency_bounds]
+        if batch_size_buckets:
+            self.batch_size_bounds = _upper_bounds(batch_size_buckets)
+        self._local = threading.local()
+        # Reentrant in case a slot is retired while its thread is being torn down
+        # during a collection.
+        self._lock = threading.RLock()
+        self._slots = []
+        self._retired = self._new_slot()
+
+    def _new_slot(self):
+        # [samples, nanoseconds, calls, latency bucket counts, size bucket counts]
+        slot = [0, 0, 0, None, None]
+        if self.latency_bounds:
+            slot[3] = [0] * len(self.latency_bounds)
+        if self.batch_size_bounds:
+            slot[4] = [0] * len(self.batch_size_bounds)
+        return slot
+
+    def slot(self):
+        """
+        Returns the calling thread's slot.
+        """
+        try:
+            return self._local.slot
+        except AttributeError:
+            slot = self._new_slot()
+            # The thread-local token is only referenced by the thread's local storage,
+            # so it is finalized when the thread exits.
+            token = _ThreadToken()
+            weakref.finalize(token, _ThreadLocalStats._retire, weakref.ref(self), slot)
+            self._local.slot = slot
+            self._local.token = token
+            with self._lock:
+                self._slots.append(slot)
+            return slot
+
+    @staticmethod
+    def _retire(stats_ref, slot):
+        stats = stats_ref()
+        if stats is None:
+            return
+        with stats._lock:
+            stats._slots.remove(slot)
+            retired = stats._retired
+            for i in range(3):
+                retired[i] += slot[i]
+            for i in (3, 4):
+                if retired[i] is not None:
+                    retired[i] = [a + b for a, b in zip(retired[i], slot[i])]
+
+    def record(self, slot, samples, nanoseconds):
+        """
+        Records a call in the calling thread's slot.
+
+        Args:
+            slot (list): The slot returned by `slot()`.
+            samples (int): The number of samples or None if the call failed.
+            nanoseconds (int): The duration of the call.
+        """
+        slot[1] += nanoseconds
+        slot[2] += 1
+        counts = slot[3]
+        if counts is not None:
+            # bisect_left finds the first bucket with an upper bound >= the value.
+            counts[bisect.bisect_left(self._latency_bounds_ns, nanoseconds)] += 1
+        if samples is None:
+            return
+        slot[0] += samples
+        counts = slot[4]
+        if counts is not None:
+            counts[bisect.bisect_left(self.batch_size_bounds, samples)] += 1
+
+    def totals(self):
+        """
+        Returns the samples, the duration in seconds, the number of calls and the
+        latency and batch size bucket counts, summed over all threads.
+        """
+        with self._lock:
+            # The retired total is copied with the live slots so that a slot retired
+            # during the summation isn't counted twice.
+            retired = self._retired
+            slots = list(self._slots)
+            slots.append(
+                [
+                    retired[0],
+                    retired[1],
+                    retired[2],
+                    retired[3] and list(retired[3]),
+                    retired[4] and list(retired[4]),
+                ]
+            )
+        samples = nanoseconds = calls = 0
+        latency_counts = size_counts = None
+        if self.latency_bounds:
+            latency_counts = [0] * len(self.latency_bounds)
+        if self.batch_size_bounds:
+            size_counts = [0] * len(self.batch_size_bounds)
+        for slot in slots:
+            samples += slot[0]
+            nanoseconds += slot[1]
+            calls += slot[2]
+            if latency_counts is not None:
+                latency_counts = [a + b for a, b in zip(latency_counts, slot[3])]
+            if size_counts is not None:
+                size_counts = [a + b for a, b in zip(size_counts, slot[4])]
+        return samples, nanoseconds / 1e9, calls, latency_counts, size_counts
+
+
+class _SlowestExemplars:
+    """
+    Chooses the exemplars of a latency histogram: the slowest observation in each
+    bucket is kept for `window` seconds, after which the next observation in the bucket
+    replaces it.
+
+    Only observations that have a trace ID are offered so the overhead of exemplars is
+    a bisection and a comparison per traced call, regardless of the call rate.
+    """
+
+    def __init__(self, bounds, window):
+        self.bounds = bounds
+        self.window = window
+        self.exemplars = [None] * len(bounds)
+        self._window_starts = [0.0] * len(bounds)
+        self._lock = threading.Lock()
+
+    def offer(self, seconds, trace_id):
+        """
+        Offers an observation as an exemplar.
+
+        Args:
+            seconds (float): The observed latency.
+            trace_id (str): The ID of the traced request.
+
+        Returns:
+            bool: True if the observation is the bucket's new exemplar.
+        """
+        i = bisect.bisect_left(self.bounds, seconds)
+        now = time.time()
+        with self._lock:
+            current = self.exemplars[i]
+            if now - self._window_starts[i] >= self.window:
+                self._window_starts[i] = now
+            elif current is not None and seconds <= current.value:
+                return False
+            self.exemplars[i] = Exemplar({"trace_id": str(trace_id)}, seconds, now)
+            return True
+
+
+def _observe_latency(histogram, exemplars, seconds, trace_id):
+    if trace_id is not None and exemplars.offer(seconds, trace_id):
+        histogram.observe(seconds, {"trace_id": str(trace_id)})
+    else:
+        histogram.observe(seconds)
+
+
+def _histogram_buckets(bounds, counts, exemplars=None):
+    buckets = []
+    total = 0
+    for i, (bound, count) in enumerate(zip(bounds, counts)):
+        total += count
+        if exemplars is not None and exemplars[i] is not None:
+            buckets.append((floatToGoString(bound), total, exemplars[i]))
+        else:
+            buckets.append((floatToGoString(bound), total))
+    return buckets
+
+
+class _FastPathCollector:
+    """
+    Exposes the thread-local statistics of an instrumented method as Prometheus
+    counters and histograms.
+    """
+
+    def __init__(self, stats, metrics, exemplars=None):
+        self.stats = stats
+        self.metrics = metrics
+        self.exemplars = exemplars
+
+    def collect(self):
+        name, count_doc, time_doc, latency_doc, size_doc = self.metrics
+        samples, seconds, _, latency_counts, size_counts = self.stats.totals()
+        exemplars = None
+        if self.exemplars is not None:
+            exemplars = list(self.exemplars.exemplars)
+        yield CounterMetricFamily(name + "_total", count_doc, value=samples)
+        yield CounterMetricFamily(name + "_time_seconds", time_doc, value=seconds)
+        if latency_counts is not None:
+            yield HistogramMetricFamily(
+                name + "_latency_seconds",
+                latency_doc,
+                buckets=_histogram_buckets(
+                    self.stats.latency_bounds, latency_counts, exemplars
+                ),
+                sum_value=seconds,
+            )
+        if size_counts is not None:
+            yield HistogramMetricFamily(
+                name + "_batch_size",
+                size_doc,
+                buckets=_histogram_buckets(self.stats.batch_size_bounds, size_counts),
+                sum_value=samples,
+            )
+
+
+class _OutputProfiler:
+    """
+    Profiles model outputs: the distribution of prediction confidences is summarized in
+    a quantile sketch and the predicted classes are counted.
+
+    For outputs with more than one column, the predicted class is the argmax and the
+    confidence is the maximum; single-column outputs are treated as probabilities of a
+    binary classifier. For a model with several outputs, the first output is profiled,
+    as it is the one that is counted, and outputs that aren't arrays are ignored.
+    """
+
+    def __init__(self, quantiles):
+        self.quantiles = list(quantiles)
+        self.sketch = QuantileSketch()
+        self.class_counts = np.zeros(0, dtype=np.int64)
+        self._lock = threading.Lock()
+
+    def update(self, y):
+        while isinstance(y, (list, tuple, dict)):
+            if not y:
+                return
+            y = next(iter(y.values())) if isinstance(y, dict) else y[0]
+        if not getattr(y, "shape", None):
+            return
+        y = np.asarray(y)
+        if len(y) == 0:
+            return
+        y = y.reshape(len(y), -1)
+        if y.shape[1] > 1:
+            classes = y.argmax(axis=1)
+            confidences = np.take_along_axis(y, classes[:, None], axis=1)
+        else:
+            classes = (y[:, 0] > 0.5).astype(np.int64)
+            confidences = np.where(classes, y[:, 0], 1 - y[:, 0])
+        counts = np.bincount(classes, minlength=len(self.class_counts))
+        with self._lock:
+            self.sketch.update(confidences)
+            if len(counts) > len(self.class_counts):
+                counts[: len(self.class_counts)] += self.class_counts
+                self.class_counts = counts
+            else:
+                self.class_counts += counts
+
+    def collect(self):
+        with self._lock:
+            count = self.sketch.count
+            total = self.sketch.sum
+            values = self.sketch.quantiles(self.quantiles)
+            class_counts = self.class_counts.copy()
+        summary = SummaryMetricFamily(
+            "gangplank_predict_confidence",
+            "The confidence (maximum score) of model predictions",
+            count_value=count,
+            sum_value=total,
+        )
+        for q, value in zip(self.quantiles, values):
+            summary.samples.append(
+                Sample(
+                    "gangplank_predict_confidence",
+                    {"quantile": floatToGoString(q)},
+                    float(value),
+                )
+            )
+        yield summary
+        counter = CounterMetricFamily(
+            "gangplank_predict_class",
+            "The number of predictions of each class",
+            labels=["class"],
+        )
+        for c, value in enumerate(class_counts):
+            counter.add_metric([str(c)], int(value))
+        yield counter
+
+
+class _DriftWindow:
+    """
+    Accumulates inputs and predictions in preallocated ring buffers so that drift can
+    be detected over windows of predictions rather than over individual batches.
+
+    For a tumbling window (step equal to size) the window is emptied after every drift
+    check; for a sliding window, a check is made every `step` predictions over the
+    latest `size` predictions. If an interval is given, a window that has received
+    predictions since the last check is also due once the interval has passed; `add`
+    checks this when predictions arrive and `due` lets a timer check it during a
+    silence.
+    """
+
+    def __init__(self, size, step=None, interval=None, keep_inputs=True):
+        self.size = size
+        self.step = step or size
+        if not 0 < self.step <= size:
+            raise ValueError("the drift window step must be in the range [1, size].")
+        self.interval = interval
+        self.keep_inputs = keep_inputs
+        self._x = None
+        self._y = None
+        self._pos = 0
+        self._count = 0
+        self._until_check = size
+        self._last_check = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _write(self, x, y):
+        if self._y is None:
+            self._y = np.empty((self.size,) + y.shape[1:], dtype=y.dtype)
+            if self.keep_inputs:
+                self._x = np.empty((self.size,) + x.shape[1:], dtype=x.dtype)
+        n = len(y)
+        end = min(self._pos + n, self.size)
+        self._y[self._pos : end] = y[: end - self._pos]
+        self._y[: n - (end - self._pos)] = y[end - self._pos :]
+        if self.keep_inputs:
+            self._x[self._pos : end] = x[: end - self._pos]
+            self._x[: n - (end - self._pos)] = x[end - self._pos :]
+        self._pos = (self._pos + n) % self.size
+        self._count = min(self._count + n, self.size)
+
+    def _window(self):
+        # Returns copies, in arrival order, since the buffers are reused.
+        if self._count < self.size:
+            start = (self._pos - self._count) % self.size
+            indices = (start + np.arange(self._count)) % self.size
+        else:
+            indices = (self._pos + np.arange(self.size)) % self.size
+        x = self._x[indices] if self.keep_inputs else None
+        window = (x, self._y[indices])
+        if self.step == self.size:
+            self._pos = self._count = 0
+        self._until_check = self.step
+        self._last_check = time.monotonic()
+        return window
+
+    def add(self, x, y):
+        """
+        Adds a batch of inputs and predictions to the window.
+
+        Returns:
+            list of (ndarray, ndarray): The windows of inputs and predictions that are
+                due for a drift check; usually an empty list.
+        """
+        y = np.asarray(y)
+        if self.keep_inputs:
+            x = np.asarray(x)
+        windows = []
+        with self._lock:
+            start = 0
+            while start < len(y):
+                n = min(len(y) - start, self._until_check)
+                self._write(
+                    x[start : start + n] if self.keep_inputs else None,
+                    y[start : start + n],
+                )
+                start += n
+                self._until_check -= n
+                if self._until_check == 0:
+                    windows.append(self._window())
+            if not windows and self._interval_passed():
+                windows.append(self._window())
+        return windows
+
+    def _interval_passed(self):
+        # Must be called with the lock held.
+        return (
+            self.interval is not None
+            and self._count
+            and self._until_check < self.step
+            and time.monotonic() - self._last_check >= self.interval
+        )
+
+    def due(self):
+        """
+        Returns the window of inputs and predictions if the interval has passed since
+        the last check and predictions have been added since then.
+
+        Returns:
+            tuple of (ndarray, ndarray): The window or None if no check is due.
+        """
+        with self._lock:
+            if self._interval_passed():
+                return self._window()
+        return None
+
+
+class _DriftWorker:
+    """
+    Runs drift detection on a background thread.
+
+    Prediction batches are queued in a bounded queue; when the queue is full either the
+    new batch or the oldest queued batch is dropped. If an interval is given,
+    `timer_func` is also called on the worker thread whenever no batch has arrived for
+    that many seconds.
+    """
+
+    def __init__(
+        self,
+        update_func,
+        queue_size,
+        drop_policy,
+        registry,
+        label_values,
+        interval=None,
+        timer_func=None,
+    ):
+        if drop_policy not in ("drop_newest", "drop_oldest"):
+            raise ValueError(f"unknown drift drop policy: {drop_policy}")
+        self.update_func = update_func
+        self.queue_size = queue_size
+        self.drop_policy = drop_policy
+        self.interval = interval
+        self.timer_func = timer_func
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+        self.dropped_counter = families.get_metric(
+            prometheus_client.Counter,
+            "gangplank_predict_drift_dropped_total",
+            "The number of prediction batches dropped by drift detection",
+            registry,
+            label_values,
+        )
+        self.lag_gauge = families.get_metric(
+            prometheus_client.Gauge,
+            "gangplank_predict_drift_lag_seconds",
+            "The time that the last checked prediction batch waited for drift "
+            "detection",
+            registry,
+            label_values,
+            multiprocess_mode="mostrecent",
+        )
+        self.queue_gauge = families.get_metric(
+            prometheus_client.Gauge,
+            "gangplank_predict_drift_queue_depth",
+            "The number of prediction batches waiting for drift detection",
+            registry,
+            label_values,
+            multiprocess_mode="livesum",
+        )
+        self._thread = threading.Thread(
+            target=self._run, name="gangplank-drift", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, x, y):
+        with self._condition:
+            if len(self._queue) >= self.queue_size:
+                self.dropped_counter.inc()
+                if self.drop_policy == "drop_newest":
+                    return
+                self._queue.popleft()
+                self.queue_gauge.dec()
+            self._queue.append((x, y, time.monotonic()))
+            self.queue_gauge.inc()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._condition.wait_for(lambda: self._queue, self.interval):
+                    batch = None
+                else:
+                    batch = self._queue.popleft()
+                    self.queue_gauge.dec()
+            try:
+                if batch is None:
+                    self.timer_func()
+                else:
+                    x, y, enqueued = batch
+                    self.lag_gauge.set(time.monotonic() - enqueued)
+                    self.update_func(x, y)
+            except Exception:
+                traceback.print_exc(file=sys.stderr)
+
+
+class _DriftTimer:
+    """
+    Calls a function on a background thread every `interval` seconds.
+    """
+
+    def __init__(self, interval, func):
+        self.interval = interval
+        self.func = func
+        self._thread = threading.Thread(
+            target=self._run, name="gangplank-drift-timer", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.func()
+            except Exception:
+                traceback.print_exc(file=sys.stderr)
+
+
 class PrometheusModel:
+    # The proxy's own attributes are slots so that they are found without a
+    # dictionary lookup; anything else is forwarded to the model by __getattr__.
+    __slots__ = (
+        "model",
+        "registry",
+        "label_values",
+        "predict_exemplars",
+        "call_exemplars",
+        "predict_stats",
+        "call_stats",
+        "predict_counter",
+        "predict_time",
+        "predict_latency",
+        "predict_batch_size",
+        "call_counter",
+        "call_time",
+        "call_latency",
+        "call_batch_size",
+        "exposition_server",
+        "periodic_pusher",
+        "get_drift_metrics_func",
+        "drift_counter",
+        "drift_p_gauge",
+        "drift_ts_gauge",
+        "drift_sample_rate",
+        "drift_requests",
+        "drift_window",
+        "drift_worker",
+        "drift_timer",
+        "output_profiler",
+        "batch_scheduler",
+        "executor",
+        "max_concurrency",
+        "async_semaphores",
+        "async_lock",
+        "in_flight_gauges",
+        "__weakref__",
+    ) + tuple(name for name, _ in _INSTRUMENTED_METHODS)
+
     def __init__(
         self,
         model,
         registry=prometheus_client.REGISTRY,
         port=None,
         get_drift_metrics_func=None,
+        fast_path=False,
+        latency_buckets=None,
+        batch_size_buckets=None,
+        max_batch_size=None,
+        max_wait_ms=5.0,
+        executor=None,
+        max_concurrency=1,
+        drift_async=False,
+        drift_sample_rate=1,
+        drift_queue_size=16,
+        drift_drop_policy="drop_newest",
+        drift_window_size=None,
+        drift_window_step=None,
+        drift_window_interval=None,
+        drift_window_inputs=True,
+        profile_outputs=False,
+        profile_quantiles=(0.01, 0.05, 0.5, 0.95, 0.99),
+        model_name=None,
+        model_version=None,
+        scrape_cache_ttl=None,
+        exemplar_window=60.0,
+        pgw_addr=None,
+        push_job="gangplank_predict",
+        push_interval=30.0,
+        push_grouping_key=None,
+        push_handler=None,
     ):
         """
         Initializes the PrometheusModel with a Keras model to proxy.
@@ -53,54 +821,406 @@ class PrometheusModel:
             registry (prometheus_client.CollectorRegistry, optional): The Prometheus
                 registry to use for metrics. Defaults to prometheus_client.REGISTRY.
             port (int, optional): If provided, starts a Prometheus HTTP server on the
-                specified port for metrics exposition.
+                specified port for metrics exposition. Not supported in multiprocess
+                mode; see the gangplank.multiprocess module.
             get_drift_metrics_func(Callable[[X: ndarray, Y: ndarray], Drift],
                     optional):
                 A function that implements a drift detection algorithm. The function
                 takes two arguments: Iterables of input data and the model's
                 predictions. The function must returns a Drift object but all Drift
                 attributes are optional.
+            fast_path (bool, optional): If True, prediction and call counts and times
+                are accumulated in per-thread counters, using `time.perf_counter_ns`,
+                and are only summed when the metrics are collected. This avoids taking
+                a lock on every call. The `predict_counter`, `predict_time`,
+                `call_counter` and `call_time` attributes are then None. Not supported
+                in multiprocess mode. Defaults to False.
+            latency_buckets (list of float, optional): If provided, the latencies of
+                `predict` and `__call__` are recorded in histograms with these buckets;
+                e.g. HISTOGRAM_LATENCY_BUCKETS.
+            batch_size_buckets (list of float, optional): If provided, the number of
+                samples per `predict` and `__call__` invocation is recorded in
+                histograms with these buckets; e.g. HISTOGRAM_BATCH_SIZE_BUCKETS.
+            max_batch_size (int, optional): If provided, concurrent `predict` calls are
+                queued and coalesced into batches of up to this many samples so that
+                the model runs once per batch. Only the `x` and `trace_id` arguments
+                of `predict` are used in this mode; the batch's latency is recorded
+                with the trace ID of its first traced request as the exemplar.
+            max_wait_ms (float, optional): When batching, the maximum time in
+                milliseconds that a `predict` call waits for other calls to fill a
+                batch. Defaults to 5.0.
+            executor (concurrent.futures.Executor, optional): The executor that runs
+                the model for `apredict` and `acall`. Defaults to the event loop's
+                default executor.
+            max_concurrency (int, optional): The maximum number of `apredict` and
+                `acall` invocations that run the model concurrently, or None for no
+                limit. Keras models aren't thread-safe, so a value greater than 1 (or
+                None) requires a model that is. Defaults to 1, in which case calls
+                never overlap, even from different event loops.
+            drift_async (bool, optional): If True, drift detection runs on a background
+                thread so that `predict` returns without waiting for it. The inputs
+                and predictions of the sampled calls are copied for the thread, so
+                callers can reuse their buffers. Exceptions raised by the drift
+                function are logged to stderr. Defaults to False.
+            drift_sample_rate (int, optional): Drift detection is run for one in
+                every `drift_sample_rate` calls to `predict`. Defaults to 1.
+            drift_queue_size (int, optional): When detecting drift asynchronously, the
+                maximum number of prediction batches waiting for drift detection.
+                Defaults to 16.
+            drift_drop_policy (str, optional): When detecting drift asynchronously and
+                the queue is full, either "drop_newest" to discard the new batch or
+                "drop_oldest" to discard the oldest queued batch. Defaults to
+                "drop_newest".
+            drift_window_size (int, optional): If provided, inputs and predictions are
+                accumulated in a bounded window of this many samples and the drift
+                function is only called when the window fills.
+            drift_window_step (int, optional): If provided, the window slides and the
+                drift function is called, with the latest `drift_window_size` samples,
+                every `drift_window_step` samples. By default, windows don't overlap.
+            drift_window_interval (float, optional): If provided, the drift function
+                is also called with a partially filled window when this many seconds
+                have passed since the last call, even if no predictions arrive; a
+                background timer (the drift thread, when detecting drift
+                asynchronously) checks the window during a silence.
+            drift_window_inputs (bool, optional): If False, inputs are not kept in the
+                window and the drift function is passed None instead of the inputs.
+                Defaults to True.
+            profile_outputs (bool, optional): If True, the outputs of `predict` and
+                `__call__` are profiled: the confidence of the predictions is exported
+                as a summary, `gangplank_predict_confidence`, and the number of
+                predictions of each class as a labelled counter,
+                `gangplank_predict_class_total`. Not supported in multiprocess mode.
+                Defaults to False.
+            profile_quantiles (list of float, optional): The confidence quantiles to
+                export when profiling outputs.
+            model_name (str, optional): If provided, all metrics are labelled with
+                `model` and `version` labels so that many models can be served from
+                one registry. The metric families are shared by all the named models in
+                the registry, so the named models must be created with the same
+                fast_path and buckets options; a ValueError is raised otherwise. Call
+                `close` to remove a model's metrics from the registry.
+            model_version (str, optional): The value of the `version` label of a named
+                model.
+            scrape_cache_ttl (float, optional): If provided with `port`, metrics are
+                exposed by a gangplank.exposition server that collects the registry at
+                most once per `scrape_cache_ttl` seconds and serves scrapes from the
+                cached snapshot.
+            exemplar_window (float, optional): When latency buckets are set, calls
+                that are given a `trace_id` are candidates for OpenMetrics exemplars of
+                the latency histograms; the slowest traced call in each bucket is kept
+                for `exemplar_window` seconds. Defaults to 60.0.
+            pgw_addr (str, optional): If provided, the registry is pushed to the
+                Pushgateway at this address every `push_interval` seconds and when
+                `close` is called or the process exits. This is intended for batch
+                inference jobs that are not scraped.
+            push_job (str, optional): The job name for pushed metrics. Defaults to
+                "gangplank_predict".
+            push_interval (float, optional): The number of seconds between pushes.
+                Defaults to 30.0.
+            push_grouping_key (dict, optional): Labels that identify this process's
+                group in the Pushgateway. Defaults to a `shard` label with the shard
+                index of a batch job, read from an environment variable such as
+                `GANGPLANK_SHARD` or `JOB_COMPLETION_INDEX` (see
+                gangplank.pushgateway.default_grouping_key), so that parallel shards
+                are pushed to separate groups and every run of a shard replaces its
+                group. The Pushgateway never expires groups; delete a group that is no
+                longer needed with `prometheus_client.delete_from_gateway`.
+            push_handler (optional): An authentication handler for the Pushgateway.
         """
+        if multiprocess.is_enabled():
+            # Custom collectors and per-process HTTP servers only see the metrics of
+            # the process that they run in.
+            if fast_path or profile_outputs:
+                raise ValueError(
+                    "fast_path and profile_outputs aren't supported in multiprocess "
+                    "mode."
+                )
+            if port is not None:
+                raise ValueError(
+                    "in multiprocess mode, expose metrics with "
+                    "gangplank.multiprocess.start_http_server rather than port."
+                )
         self.model = model
         self.registry = registry
-        self.predict_counter = prometheus_client.Counter(
-            "gangplank_predict_total",
-            "The number of model predictions",
-            registry=registry,
-        )
-        self.predict_time = prometheus_client.Counter(
-            "gangplank_predict_time_seconds",
-            "The amount of time spent in the predict method",
-            registry=registry,
-        )
-        self.call_counter = prometheus_client.Counter(
-            "gangplank_predict_call_total",
-            "The number of __call__ invocations",
-            registry=registry,
-        )
-        self.call_time = prometheus_client.Counter(
-            "gangplank_predict_call_time_seconds",
-            "The amount of time spent in the __call__ method",
-            registry=registry,
-        )
+        self.label_values = None
+        if model_name is not None:
+            self.label_values = (model_name, model_version or "")
+            # The options that determine which metric families the model exports.
+            options = {"fast_path": bool(fast_path)}
+            for option, buckets in (
+                ("latency_buckets", latency_buckets),
+                ("batch_size_buckets", batch_size_buckets),
+            ):
+                options[option] = _upper_bounds(buckets) if buckets else None
+            families.register_model(registry, self.label_values, options)
+        self.predict_exemplars = None
+        self.call_exemplars = None
+        if latency_buckets:
+            bounds = _upper_bounds(latency_buckets)
+            self.predict_exemplars = _SlowestExemplars(bounds, exemplar_window)
+            self.call_exemplars = _SlowestExemplars(bounds, exemplar_window)
+        self.predict_stats = None
+        self.call_stats = None
+        if fast_path:
+            self.predict_stats = _ThreadLocalStats(latency_buckets, batch_size_buckets)
+            self.call_stats = _ThreadLocalStats(latency_buckets, batch_size_buckets)
+            self.predict_counter = self.predict_time = None
+            self.predict_latency = self.predict_batch_size = None
+            self.call_counter = self.call_time = None
+            self.call_latency = self.call_batch_size = None
+            families.register_collector(
+                registry,
+                "predict",
+                _FastPathCollector(
+                    self.predict_stats, _PREDICT_METRICS, self.predict_exemplars
+                ),
+                self.label_values,
+            )
+            families.register_collector(
+                registry,
+                "call",
+                _FastPathCollector(self.call_stats, _CALL_METRICS, self.call_exemplars),
+                self.label_values,
+            )
+        else:
+            (
+                self.predict_counter,
+                self.predict_time,
+                self.predict_latency,
+                self.predict_batch_size,
+            ) = self._create_metrics(
+                _PREDICT_METRICS, latency_buckets, batch_size_buckets
+            )
+            (
+                self.call_counter,
+                self.call_time,
+                self.call_latency,
+                self.call_batch_size,
+            ) = self._create_metrics(_CALL_METRICS, latency_buckets, batch_size_buckets)
+        self.exposition_server = None
         if port is not None:
-            prometheus_client.start_http_server(port, registry=registry)
+            if scrape_cache_ttl is None:
+                prometheus_client.start_http_server(port, registry=registry)
+            else:
+                self.exposition_server = exposition.start_http_server(
+                    port, registry=registry, ttl=scrape_cache_ttl
+                )
+        self.periodic_pusher = None
+        if pgw_addr is not None:
+            if push_grouping_key is None:
+                push_grouping_key = pushgateway.default_grouping_key()
+            self.periodic_pusher = pushgateway.PeriodicPusher(
+                registry,
+                functools.partial(
+                    pushgateway.push_registry,
+                    pgw_addr,
+                    push_job,
+                    handler=push_handler,
+                    grouping_key=push_grouping_key,
+                ),
+                push_interval,
+            )
+            atexit.register(self.close)
         self.get_drift_metrics_func = get_drift_metrics_func
         self.drift_counter = None
         self.drift_p_gauge = None
         self.drift_ts_gauge = None
+        self.drift_sample_rate = drift_sample_rate
+        self.drift_requests = 0
+        self.drift_window = None
+        if drift_window_size is not None:
+            self.drift_window = _DriftWindow(
+                drift_window_size,
+                drift_window_step,
+                drift_window_interval,
+                drift_window_inputs,
+            )
+        self.drift_worker = None
+        self.drift_timer = None
+        timer_interval = None
+        if self.drift_window is not None and get_drift_metrics_func is not None:
+            timer_interval = drift_window_interval
+        if drift_async and get_drift_metrics_func is not None:
+            self.drift_worker = _DriftWorker(
+                self._update_drift_metrics,
+                drift_queue_size,
+                drift_drop_policy,
+                registry,
+                self.label_values,
+                timer_interval,
+                self._check_drift_window,
+            )
+        elif timer_interval is not None:
+            self.drift_timer = _DriftTimer(timer_interval, self._check_drift_window)
+        self.output_profiler = None
+        if profile_outputs:
+            self.output_profiler = _OutputProfiler(profile_quantiles)
+            families.register_collector(
+                registry, "profile", self.output_profiler, self.label_values
+            )
+        self.batch_scheduler = None
+        if max_batch_size is not None:
+            self.batch_scheduler = BatchScheduler(
+                lambda x, trace_id: self._predict(
+                    x, max_batch_size, 0, None, [], trace_id
+                ),
+                max_batch_size,
+                max_wait_ms,
+                registry=registry,
+                wait_buckets=HISTOGRAM_LATENCY_BUCKETS,
+                label_values=self.label_values,
+            )
+        self.executor = executor
+        self.max_concurrency = max_concurrency
+        # A semaphore belongs to one event loop, so every loop gets its own and a lock
+        # in the executor serializes the calls of every loop.
+        self.async_semaphores = weakref.WeakKeyDictionary()
+        self.async_lock = threading.Lock() if max_concurrency == 1 else None
+        self.in_flight_gauges = {}
+        # The wrappers are bound to the instance so that calls to them don't fall
+        # through to __getattr__.
+        for method_name, count_from in _INSTRUMENTED_METHODS:
+            method = getattr(model, method_name, None)
+            if method is not None:
+                wrapper = self._instrument(
+                    method,
+                    method_name,
+                    count_from,
+                    fast_path,
+                    latency_buckets,
+                    batch_size_buckets,
+                )
+                setattr(self, method_name, wrapper)
+
+    def _instrument(
+        self,
+        method,
+        method_name,
+        count_from,
+        fast_path,
+        latency_buckets,
+        batch_size_buckets,
+    ):
+        metrics = _method_metrics(method_name)
+        if fast_path:
+
+            def create_stats():
+                stats = _ThreadLocalStats(latency_buckets, batch_size_buckets)
+                families.register_collector(
+                    self.registry,
+                    method_name,
+                    _FastPathCollector(stats, metrics),
+                    self.label_values,
+                )
+                return stats
+
+            lazy_stats = _LazyMetrics(create_stats)
+
+            @functools.wraps(method)
+            def fast_wrapper(*args, **kwds):
+                stats = lazy_stats.get()
+                slot = stats.slot()
+                samples = None
+                start_time = time.perf_counter_ns()
+                try:
+                    res = method(*args, **kwds)
+                    samples = _num_samples(_counted(count_from, res, args, kwds))
+                    return res
+                finally:
+                    stats.record(slot, samples, time.perf_counter_ns() - start_time)
+
+            return fast_wrapper
+
+        lazy_metrics = _LazyMetrics(
+            functools.partial(
+                self._create_metrics, metrics, latency_buckets, batch_size_buckets
+            )
+        )
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwds):
+            counter, timer, latency, batch_size = lazy_metrics.get()
+            start_time = time.time()
+            try:
+                res = method(*args, **kwds)
+                samples = _num_samples(_counted(count_from, res, args, kwds))
+                if samples is not None:
+                    counter.inc(samples)
+                    if batch_size is not None:
+                        batch_size.observe(samples)
+                return res
+            finally:
+                elapsed_time = time.time() - start_time
+                timer.inc(elapsed_time)
+                if latency is not None:
+                    latency.observe(elapsed_time)
+
+        return wrapper
+
+    def _get_metric(self, metric_class, name, documentation, **kwargs):
+        return families.get_metric(
+            metric_class,
+            name,
+            documentation,
+            self.registry,
+            self.label_values,
+            **kwargs,
+        )
+
+    def _create_metrics(self, metrics, latency_buckets, batch_size_buckets):
+        name, count_doc, time_doc, latency_doc, size_doc = metrics
+        counter = self._get_metric(
+            prometheus_client.Counter, name + "_total", count_doc
+        )
+        timer = self._get_metric(
+            prometheus_client.Counter, name + "_time_seconds", time_doc
+        )
+        latency = batch_size = None
+        if latency_buckets:
+            latency = self._get_metric(
+                prometheus_client.Histogram,
+                name + "_latency_seconds",
+                latency_doc,
+                buckets=latency_buckets,
+            )
+        if batch_size_buckets:
+            batch_size = self._get_metric(
+                prometheus_client.Histogram,
+                name + "_batch_size",
+                size_doc,
+                buckets=batch_size_buckets,
+            )
+        return counter, timer, latency, batch_size
 
     def __getattr__(self, name):
         return getattr(self.model, name)
 
+    def close(self, timeout=None):
+        """
+        Pushes the final values of the metrics if a Pushgateway address was given. This
+        is also done when the process exits. If the model was given a name, its metrics
+        are then removed from the registry's shared families and its name and version
+        can be registered again; e.g. when a new version replaces it. The proxy should
+        not be used after it is closed.
+
+        Args:
+            timeout (float, optional): The maximum number of seconds to wait for the
+                push.
+        """
+        if self.periodic_pusher is not None:
+            self.periodic_pusher.close(timeout)
+            atexit.unregister(self.close)
+        if self.label_values is not None:
+            families.unregister_model(self.registry, self.label_values)
+
     def _update_drift_counter(self, count):
         if count is None:
             return
         if self.drift_counter is None:
-            self.drift_counter = prometheus_client.Counter(
+            self.drift_counter = self._get_metric(
+                prometheus_client.Counter,
                 "gangplank_predict_drift_detected_total",
                 "A count of drift detection incidents",
-                registry=self.registry,
             )
         self.drift_counter.inc(count)
 
@@ -108,10 +1228,11 @@ class PrometheusModel:
         if value is None:
             return
         if self.drift_p_gauge is None:
-            self.drift_p_gauge = prometheus_client.Gauge(
+            self.drift_p_gauge = self._get_metric(
+                prometheus_client.Gauge,
                 "gangplank_predict_drift_p_value",
                 "A p-value that quantifies the likelihood that drift has not occurred",
-                registry=self.registry,
+                multiprocess_mode="mostrecent",
             )
         self.drift_p_gauge.set(value)
 
@@ -119,34 +1240,210 @@ class PrometheusModel:
         if value is None:
             return
         if self.drift_ts_gauge is None:
-            self.drift_ts_gauge = prometheus_client.Gauge(
+            self.drift_ts_gauge = self._get_metric(
+                prometheus_client.Gauge,
                 "gangplank_predict_drift_test_statistic",
                 "A measure of the distance between observed and expected data",
-                registry=self.registry,
+                multiprocess_mode="mostrecent",
             )
         self.drift_ts_gauge.set(value)
 
-    def predict(self, x, batch_size=32, verbose="auto", steps=None, callbacks=[]):
+    def _update_drift_metrics(self, x, y):
+        if self.drift_window is not None:
+            for window_x, window_y in self.drift_window.add(x, y):
+                self._run_drift_func(window_x, window_y)
+        else:
+            self._run_drift_func(x, y)
+
+    def _check_drift_window(self):
+        window = self.drift_window.due()
+        if window is not None:
+            self._run_drift_func(*window)
+
+    def _run_drift_func(self, x, y):
+        drift = self.get_drift_metrics_func(x, y)
+        self._update_drift_counter(drift.drift_detected)
+        self._update_drift_p_value(drift.p_value)
+        self._update_drift_test_statistic(drift.test_statistic)
+
+    def _run_predict_hooks(self, x, y):
+        # The hooks that run before predict returns share one read-only view of the
+        # outputs so that they can neither copy nor modify the caller's arrays. The
+        # views are only built for the hooks that run, since building one can copy a
+        # backend tensor to the host.
+        y_view = None
+        if self.output_profiler is not None:
+            y_view = _readonly_view(y)
+            self.output_profiler.update(y_view)
+        if self.get_drift_metrics_func is not None and self._drift_sampled():
+            if self.drift_worker is not None:
+                # The worker runs after predict has returned, when the caller may be
+                # reusing its buffers, so it gets copies; only sampled requests are
+                # copied.
+                self.drift_worker.submit(_readonly_copy(x), _readonly_copy(y))
+                return
+            if y_view is None:
+                y_view = _readonly_view(y)
+            self._update_drift_metrics(_readonly_view(x), y_view)
+
+    def _drift_sampled(self):
+        if self.drift_sample_rate > 1:
+            self.drift_requests += 1
+            if self.drift_requests % self.drift_sample_rate:
+                return False
+        return True
+
+    def predict(
+        self,
+        x,
+        batch_size=32,
+        verbose="auto",
+        steps=None,
+        callbacks=[],
+        trace_id=None,
+    ):
+        if self.batch_scheduler is not None:
+            return self.batch_scheduler.predict(x, trace_id)
+        return self._predict(x, batch_size, verbose, steps, callbacks, trace_id)
+
+    def _predict(self, x, batch_size, verbose, steps, callbacks, trace_id=None):
+        if self.predict_stats is not None:
+            slot = self.predict_stats.slot()
+            samples = None
+            start_time = time.perf_counter_ns()
+            try:
+                y = self.model.predict(x, batch_size, verbose, steps, callbacks)
+                samples = _num_samples(y)
+                self._run_predict_hooks(x, y)
+                return y
+            finally:
+                elapsed_ns = time.perf_counter_ns() - start_time
+                self.predict_stats.record(slot, samples, elapsed_ns)
+                if trace_id is not None and self.predict_exemplars is not None:
+                    self.predict_exemplars.offer(elapsed_ns / 1e9, trace_id)
+
         start_time = time.time()
 
         try:
             y = self.model.predict(x, batch_size, verbose, steps, callbacks)
-            self.predict_counter.inc(len(y))
-
-            if self.get_drift_metrics_func is not None:
-                drift = self.get_drift_metrics_func(x, y)
-                self._update_drift_counter(drift.drift_detected)
-                self._update_drift_p_value(drift.p_value)
-                self._update_drift_test_statistic(drift.test_statistic)
+            samples = _num_samples(y)
+            if samples is not None:
+                self.predict_counter.inc(samples)
+                if self.predict_batch_size is not None:
+                    self.predict_batch_size.observe(samples)
+            self._run_predict_hooks(x, y)
             return y
         finally:
-            self.predict_time.inc(time.time() - start_time)
+            elapsed_time = time.time() - start_time
+            self.predict_time.inc(elapsed_time)
+            if self.predict_latency is not None:
+                _observe_latency(
+                    self.predict_latency,
+                    self.predict_exemplars,
+                    elapsed_time,
+                    trace_id,
+                )
+
+    def _get_in_flight_gauge(self, name, desc):
+        gauge = self.in_flight_gauges.get(name)
+        if gauge is None:
+            gauge = self.in_flight_gauges[name] = self._get_metric(
+                prometheus_client.Gauge, name, desc, multiprocess_mode="livesum"
+            )
+        return gauge
+
+    def _run_locked(self, func):
+        with self.async_lock:
+            return func()
+
+    async def _run_async(self, func):
+        loop = asyncio.get_running_loop()
+        if self.async_lock is not None:
+            func = functools.partial(self._run_locked, func)
+        if self.max_concurrency is None:
+            return await loop.run_in_executor(self.executor, func)
+        semaphore = self.async_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self.async_semaphores[loop] = asyncio.Semaphore(
+                self.max_concurrency
+            )
+        async with semaphore:
+            return await loop.run_in_executor(self.executor, func)
+
+    async def apredict(
+        self,
+        x,
+        batch_size=32,
+        verbose="auto",
+        steps=None,
+        callbacks=[],
+        trace_id=None,
+    ):
+        """
+        An asyncio version of `predict` that runs the model in the executor so that
+        the event loop is not blocked.
+        """
+        gauge = self._get_in_flight_gauge(
+            "gangplank_predict_in_flight",
+            "The number of apredict invocations in progress",
+        )
+        with gauge.track_inprogress():
+            if self.batch_scheduler is not None:
+                return await asyncio.wrap_future(
+                    self.batch_scheduler.submit(x, trace_id)
+                )
+            return await self._run_async(
+                functools.partial(
+                    self._predict, x, batch_size, verbose, steps, callbacks, trace_id
+                )
+            )
+
+    async def acall(self, *args, **kwds):
+        """
+        An asyncio version of `__call__` that runs the model in the executor so that
+        the event loop is not blocked.
+        """
+        gauge = self._get_in_flight_gauge(
+            "gangplank_predict_call_in_flight",
+            "The number of acall invocations in progress",
+        )
+        with gauge.track_inprogress():
+            return await self._run_async(
+                functools.partial(self.__call__, *args, **kwds)
+            )
+
+    def __call__(self, *args, trace_id=None, **kwds):
+        if self.call_stats is not None:
+            slot = self.call_stats.slot()
+            samples = None
+            start_time = time.perf_counter_ns()
+            try:
+                res = self.model(*args, **kwds)
+                samples = _num_samples(res)
+                if self.output_profiler is not None:
+                    self.output_profiler.update(_readonly_view(res))
+                return res
+            finally:
+                elapsed_ns = time.perf_counter_ns() - start_time
+                self.call_stats.record(slot, samples, elapsed_ns)
+                if trace_id is not None and self.call_exemplars is not None:
+                    self.call_exemplars.offer(elapsed_ns / 1e9, trace_id)
 
-    def __call__(self, *args, **kwds):
         start_time = time.time()
         try:
             res = self.model.__call__(*args, **kwds)
-            self.call_counter.inc(len(res))
+            samples = _num_samples(res)
+            if samples is not None:
+                self.call_counter.inc(samples)
+                if self.call_batch_size is not None:
+                    self.call_batch_size.observe(samples)
+            if self.output_profiler is not None:
+                self.output_profiler.update(_readonly_view(res))
             return res
         finally:
-            self.call_time.inc(time.time() - start_time)
+            elapsed_time = time.time() - start_time
+            self.call_time.inc(elapsed_time)
+            if self.call_latency is not None:
+                _observe_latency(
+                    self.call_latency, self.call_exemplars, elapsed_time, trace_id
+                )
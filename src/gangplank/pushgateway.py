@@ -0,0 +1,621 @@
+"""
+This module provides helpers for pushing metrics to a Prometheus Pushgateway without
+blocking the caller.
+
+Classes:
+    AsyncPusher:
+        Pushes snapshots of a Prometheus registry to a Pushgateway from a background
+        thread. Pending snapshots are coalesced so that only the latest state is
+        pushed, failed pushes are retried with exponential backoff and `flush` waits
+        until the latest snapshot has been delivered.
+    PeriodicPusher:
+        Pushes a registry on a background timer and once more when closed, for
+        processes, like batch jobs, that are never scraped.
+    PushSpool:
+        Pushes registries to a Pushgateway and, while the gateway is unavailable,
+        appends the pushes to a size-capped local file from which they are replayed,
+        in order, once the gateway recovers.
+
+Functions:
+    push_registry: Pushes a registry to a Pushgateway.
+    default_grouping_key: Returns a grouping key that identifies the current process's
+        shard of a batch job.
+
+Constants:
+    SHARD_ENV_VARS: The environment variables from which a shard index is read.
+
+Dependencies:
+    - prometheus_client
+    - threading
+"""
+
+import collections
+import json
+import os
+import struct
+import sys
+import threading
+import time
+import traceback
+import typing
+import zlib
+
+import prometheus_client
+from prometheus_client import push_to_gateway
+from prometheus_client.parser import text_string_to_metric_families
+
+
+def push_registry(pgw_addr, job, registry, handler=None, grouping_key=None):
+    """
+    Pushes a registry to a Pushgateway, replacing the metrics in the registry's group.
+
+    Args:
+        pgw_addr (str): The address of the Pushgateway.
+        job (str): The job name.
+        registry: The registry (or anything with a `collect` method) to push.
+        handler (optional): An authentication handler for the gateway.
+        grouping_key (dict, optional): Labels, in addition to the job, that identify
+            the group of metrics.
+    """
+    kwargs = {}
+    if handler:
+        kwargs["handler"] = handler
+    if grouping_key:
+        kwargs["grouping_key"] = grouping_key
+    push_to_gateway(pgw_addr, job, registry, **kwargs)
+
+
+# The environment variables, in order of precedence, from which the index of a shard of
+# a batch job is read: gangplank's own and those set by Kubernetes indexed jobs, Slurm
+# job arrays, AWS Batch array jobs and Cloud Run jobs.
+SHARD_ENV_VARS = (
+    "GANGPLANK_SHARD",
+    "JOB_COMPLETION_INDEX",
+    "SLURM_ARRAY_TASK_ID",
+    "AWS_BATCH_JOB_ARRAY_INDEX",
+    "CLOUD_RUN_TASK_INDEX",
+)
+
+
+def default_grouping_key():
+    """
+    Returns a grouping key with the index of the current process's shard of a batch
+    job, read from the first of SHARD_ENV_VARS that is set, or "0" if none is.
+
+    The key is the same every time the shard runs, so each run replaces the previous
+    run's metrics in the same group rather than creating a new group; the Pushgateway
+    never expires groups. Shards of a job that run in parallel must be given different
+    indexes (e.g. by setting `GANGPLANK_SHARD`) or grouping keys so that they don't
+    overwrite one another.
+    """
+    for name in SHARD_ENV_VARS:
+        shard = os.environ.get(name)
+        if shard:
+            return {"shard": shard}
+    return {"shard": "0"}
+
+
+class _RegistrySnapshot:
+    """
+    A frozen copy of the metrics in a registry.
+
+    `push_to_gateway` only needs an object with a `collect` method so a snapshot can be
+    pushed in place of the live registry while training continues to update it.
+    """
+
+    def __init__(self, registry):
+        self.metrics = list(registry.collect())
+
+    def collect(self):
+        return self.metrics
+
+
+class AsyncPusher:
+    """
+    Pushes registry snapshots to a Pushgateway from a background thread.
+
+    Args:
+        push_func (Callable[[registry], None]): A function that pushes a registry (or
+            anything with a `collect` method) to the Pushgateway; e.g. a closure over
+            `prometheus_client.push_to_gateway`.
+        max_retries (int, optional): The number of times that a failed push is retried.
+            Defaults to 3.
+        backoff (float, optional): The delay in seconds before the first retry; the
+            delay doubles after every failed retry. Defaults to 0.5.
+        max_backoff (float, optional): The maximum delay in seconds between retries.
+            Defaults to 30.0.
+        ignore_exceptions (bool, optional): If True, a push that still fails after all
+            retries is logged to stderr; otherwise, the exception is raised from the
+            next call to `submit` or `flush`. Defaults to True.
+    """
+
+    def __init__(
+        self,
+        push_func,
+        max_retries=3,
+        backoff=0.5,
+        max_backoff=30.0,
+        ignore_exceptions=True,
+    ):
+        self.push_func = push_func
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.ignore_exceptions = ignore_exceptions
+        self._condition = threading.Condition()
+        # The queue is bounded to a single pending snapshot; a newer snapshot replaces
+        # an older one that has not been pushed yet.
+        self._pending = None
+        self._busy = False
+        self._closed = False
+        self._error = None
+        self._thread = threading.Thread(
+            target=self._run, name="gangplank-pusher", daemon=True
+        )
+        self._thread.start()
+
+    def _raise_error(self):
+        # Must be called with the condition held.
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def submit(self, registry):
+        """
+        Queues a snapshot of the registry for pushing and returns immediately.
+
+        Args:
+            registry (prometheus_client.CollectorRegistry): The registry to push.
+        """
+        snapshot = _RegistrySnapshot(registry)
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("cannot submit metrics to a closed pusher.")
+            self._raise_error()
+            self._pending = snapshot
+            self._condition.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        Waits until the most recently submitted snapshot has been pushed (or has
+        exhausted its retries).
+
+        Args:
+            timeout (float, optional): The maximum number of seconds to wait.
+
+        Returns:
+            bool: False if the timeout expired before the push completed.
+        """
+        with self._condition:
+            done = self._condition.wait_for(
+                lambda: self._pending is None and not self._busy, timeout
+            )
+            self._raise_error()
+            return done
+
+    def close(self, timeout=None):
+        """
+        Flushes any pending snapshot and stops the background thread.
+
+        Args:
+            timeout (float, optional): The maximum number of seconds to wait for the
+                flush.
+
+        Returns:
+            bool: False if the timeout expired before the push completed.
+        """
+        try:
+            return self.flush(timeout)
+        finally:
+            with self._condition:
+                self._closed = True
+                self._condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._pending is not None or self._closed
+                )
+                if self._pending is None:
+                    return
+                snapshot, self._pending = self._pending, None
+                self._busy = True
+            try:
+                self._push(snapshot)
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
+
+    def _push(self, snapshot):
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.push_func(snapshot)
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self._handle_error(e)
+                    return
+            with self._condition:
+                # Stop retrying a snapshot that has been superseded by a newer one.
+                if self._condition.wait_for(lambda: self._pending is not None, delay):
+                    return
+            delay = min(2 * delay, self.max_backoff)
+
+    def _handle_error(self, e):
+        if self.ignore_exceptions:
+            traceback.print_exception(e, file=sys.stderr)
+        else:
+            with self._condition:
+                self._error = e
+
+
+class PeriodicPusher:
+    """
+    Pushes a registry to a Pushgateway every `interval` seconds and once more when
+    closed.
+
+    Every push replaces the process's group with the registry's current, cumulative
+    values so a push that is lost or repeated does not distort the totals; the totals
+    of parallel processes are aggregated by summing over their groups. The Pushgateway
+    keeps a group until it is deleted, so groups should identify shards rather than
+    runs (see `default_grouping_key`); the groups of shards that no longer run, e.g.
+    after a job is scaled down, can be deleted with
+    `prometheus_client.delete_from_gateway(pgw_addr, job, grouping_key)`.
+
+    Args:
+        registry (prometheus_client.CollectorRegistry): The registry to push.
+        push_func (Callable[[registry], None]): A function that pushes a registry; e.g.
+            a closure over `push_registry`.
+        interval (float): The number of seconds between pushes.
+        ignore_exceptions (bool, optional): If True, failed pushes are logged to
+            stderr; otherwise, the exception is raised from `close`. Defaults to True.
+    """
+
+    def __init__(self, registry, push_func, interval, ignore_exceptions=True):
+        self.registry = registry
+        self.interval = interval
+        self.pusher = AsyncPusher(push_func, ignore_exceptions=ignore_exceptions)
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._error = None
+        self._thread = threading.Thread(
+            target=self._run, name="gangplank-periodic-pusher", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.pusher.submit(self.registry)
+            except Exception as e:
+                # Only raised if exceptions aren't ignored; it's re-raised by close.
+                self._error = e
+
+    def close(self, timeout=None):
+        """
+        Stops the timer, pushes the registry's final values and waits for the push.
+        Calling `close` more than once has no effect.
+
+        Args:
+            timeout (float, optional): The maximum number of seconds to wait for the
+                push.
+
+        Returns:
+            bool: False if the timeout expired before the push completed.
+        """
+        with self._lock:
+            if self._closed:
+                return True
+            self._closed = True
+        self._stopped.set()
+        self._thread.join()
+        if self._error is not None:
+            self.pusher.close(timeout)
+            raise self._error
+        self.pusher.submit(self.registry)
+        return self.pusher.close(timeout)
+
+
+# A spooled push is stored as a header, the push's destination as JSON and the
+# zlib-compressed metrics in the Prometheus text format. The header holds the lengths of
+# the destination and the metrics, the CRC-32 of both and the time of the push.
+_SPOOL_HEADER = struct.Struct("<IIId")
+
+
+class _SpooledPush(typing.NamedTuple):
+    offset: int
+    size: int
+    created: float
+    destination: tuple
+
+
+def _destination(pgw_addr, job, grouping_key):
+    return (pgw_addr, job, tuple(sorted((grouping_key or {}).items())))
+
+
+def _encode_push(destination, created, registry):
+    pgw_addr, job, grouping_key = destination
+    encoded_destination = json.dumps([pgw_addr, job, grouping_key]).encode()
+    metrics = zlib.compress(prometheus_client.generate_latest(registry))
+    crc = zlib.crc32(metrics, zlib.crc32(encoded_destination))
+    header = _SPOOL_HEADER.pack(len(encoded_destination), len(metrics), crc, created)
+    return header + encoded_destination + metrics
+
+
+class _SpooledMetrics:
+    """
+    The metrics of a spooled push, parsed from the Prometheus text format.
+    """
+
+    def __init__(self, text):
+        self.metrics = list(text_string_to_metric_families(text))
+
+    def collect(self):
+        return self.metrics
+
+
+class PushSpool:
+    """
+    Pushes registries to a Pushgateway, spooling the pushes that fail to an
+    append-only file and replaying them once the gateway is available again.
+
+    Every push replaces the metrics in its group so, while the spool isn't empty, a new
+    push is spooled behind the pushes that are waiting rather than overtaking them.
+    Pushes are replayed in order, in batches of `replay_batch_size`; within a batch,
+    only the newest push to each group is sent since it replaces the others. Each call
+    to `push` replays at most one batch, so a long backlog is drained over several
+    pushes rather than stalling the caller. The
+    position of the next push to replay is kept in a `.offset` file next to the spool so
+    that a spool left behind by a failed process is replayed by the next process that
+    uses it.
+
+    Args:
+        path (str): The path of the spool file.
+        max_bytes (int, optional): The maximum size of the spool. When a push would
+            exceed it, only the newest push to each group is kept and, if that isn't
+            enough, the oldest pushes are dropped. Defaults to 64 MiB.
+        replay_batch_size (int, optional): The number of spooled pushes that are read
+            and replayed at a time. Defaults to 100.
+        handler (optional): An authentication handler for the gateway.
+        registry (prometheus_client.CollectorRegistry, optional): The Prometheus
+            registry to use for metrics. Defaults to prometheus_client.REGISTRY.
+
+    The following metrics are exported:
+        - `gangplank_push_spool_entries`: The number of pushes waiting to be replayed.
+        - `gangplank_push_spool_bytes`: The size of the pushes waiting to be replayed.
+        - `gangplank_push_spool_replay_lag_seconds`: The time between spooling and
+            replaying the most recently replayed push.
+        - `gangplank_push_spool_dropped_total`: The number of pushes dropped to keep
+            the spool under `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        path,
+        max_bytes=64 * 2**20,
+        replay_batch_size=100,
+        handler=None,
+        registry=prometheus_client.REGISTRY,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.replay_batch_size = replay_batch_size
+        self.handler = handler
+        self._offset_path = path + ".offset"
+        self._lock = threading.Lock()
+        self._entries = collections.deque()
+
+        self.depth = prometheus_client.Gauge(
+            "gangplank_push_spool_entries",
+            "The number of pushes waiting to be replayed",
+            registry=registry,
+        )
+        self.size = prometheus_client.Gauge(
+            "gangplank_push_spool_bytes",
+            "The size of the pushes waiting to be replayed",
+            registry=registry,
+        )
+        self.replay_lag = prometheus_client.Gauge(
+            "gangplank_push_spool_replay_lag_seconds",
+            "The time between spooling and replaying the last replayed push",
+            registry=registry,
+        )
+        self.dropped = prometheus_client.Counter(
+            "gangplank_push_spool_dropped_total",
+            "The number of spooled pushes dropped to keep the spool under its cap",
+            registry=registry,
+        )
+        self._load()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _load(self):
+        try:
+            with open(self._offset_path) as f:
+                offset = int(f.read())
+        except (FileNotFoundError, ValueError):
+            offset = 0
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+        while offset + _SPOOL_HEADER.size <= len(data):
+            destination_size, metrics_size, crc, created = _SPOOL_HEADER.unpack_from(
+                data, offset
+            )
+            start = offset + _SPOOL_HEADER.size
+            end = start + destination_size + metrics_size
+            body = data[start:end]
+            if len(body) != destination_size + metrics_size or zlib.crc32(body) != crc:
+                # A push that was being written when the process died.
+                break
+            pgw_addr, job, grouping_key = json.loads(body[:destination_size])
+            destination = (pgw_addr, job, tuple(tuple(kv) for kv in grouping_key))
+            self._entries.append(
+                _SpooledPush(offset, end - offset, created, destination)
+            )
+            offset = end
+        if offset < len(data):
+            with open(self.path, "r+b") as f:
+                f.truncate(offset)
+        if not self._entries:
+            self._clear()
+        self._update_metrics()
+
+    def _update_metrics(self):
+        self.depth.set(len(self._entries))
+        self.size.set(sum(entry.size for entry in self._entries))
+
+    def _save_offset(self):
+        offset = self._entries[0].offset if self._entries else 0
+        tmp_path = self._offset_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(offset))
+        os.replace(tmp_path, self._offset_path)
+
+    def _clear(self):
+        for path in (self.path, self._offset_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _read(self, entries):
+        with open(self.path, "rb") as f:
+            for entry in entries:
+                f.seek(entry.offset)
+                yield entry, f.read(entry.size)
+
+    def _append(self, destination, registry):
+        created = time.time()
+        record = _encode_push(destination, created, registry)
+        if len(record) > self.max_bytes:
+            self.dropped.inc()
+            return
+        size = sum(entry.size for entry in self._entries)
+        if size + len(record) > self.max_bytes:
+            self._compact(self.max_bytes - len(record))
+        try:
+            offset = os.path.getsize(self.path)
+        except FileNotFoundError:
+            offset = 0
+        with open(self.path, "ab") as f:
+            f.write(record)
+            f.flush()
+            os.fsync(f.fileno())
+        self._entries.append(_SpooledPush(offset, len(record), created, destination))
+        if len(self._entries) == 1:
+            self._save_offset()
+
+    def _compact(self, max_bytes):
+        # The newest push to a group replaces the older ones.
+        newest = {}
+        for entry in self._entries:
+            newest[entry.destination] = entry
+        kept = [entry for entry in self._entries if newest[entry.destination] is entry]
+        size = sum(entry.size for entry in kept)
+        first = 0
+        while first < len(kept) and size > max_bytes:
+            size -= kept[first].size
+            first += 1
+        kept = kept[first:]
+        self.dropped.inc(len(self._entries) - len(kept))
+        tmp_path = self.path + ".tmp"
+        entries = collections.deque()
+        with open(tmp_path, "wb") as f:
+            for entry, record in self._read(kept):
+                entries.append(entry._replace(offset=f.tell()))
+                f.write(record)
+            f.flush()
+            os.fsync(f.fileno())
+        self._entries = entries
+        # If the process dies between saving the offset and replacing the spool, the
+        # old spool is replayed from the start, which repeats pushes but loses none.
+        self._save_offset()
+        os.replace(tmp_path, self.path)
+
+    def _replay(self, max_batches=None):
+        batches = 0
+        while self._entries and (max_batches is None or batches < max_batches):
+            batches += 1
+            batch = list(self._entries)[: self.replay_batch_size]
+            newest = {}
+            for entry in batch:
+                newest[entry.destination] = entry
+            replayed = [entry for entry in batch if newest[entry.destination] is entry]
+            for entry, record in self._read(replayed):
+                destination_size = _SPOOL_HEADER.unpack_from(record)[0]
+                metrics = record[_SPOOL_HEADER.size + destination_size :]
+                pgw_addr, job, grouping_key = entry.destination
+                push_registry(
+                    pgw_addr,
+                    job,
+                    _SpooledMetrics(zlib.decompress(metrics).decode()),
+                    handler=self.handler,
+                    grouping_key=dict(grouping_key),
+                )
+                self.replay_lag.set(time.time() - entry.created)
+            for _ in batch:
+                self._entries.popleft()
+            if self._entries:
+                self._save_offset()
+            else:
+                self._clear()
+            self._update_metrics()
+
+    def replay(self):
+        """
+        Replays the spooled pushes in order.
+
+        Raises:
+            Exception: The error of a push that failed; the pushes from the failed
+                batch onward remain in the spool.
+        """
+        with self._lock:
+            self._replay()
+
+    def push(self, pgw_addr, job, registry, grouping_key=None):
+        """
+        Replays a batch of spooled pushes and then pushes a registry, spooling the push
+        if the gateway is unavailable or if spooled pushes are still waiting.
+
+        Args:
+            pgw_addr (str): The address of the Pushgateway.
+            job (str): The job name.
+            registry: The registry (or anything with a `collect` method) to push.
+            grouping_key (dict, optional): Labels, in addition to the job, that
+                identify the group of metrics.
+
+        Returns:
+            bool: True if the push was delivered and False if it was spooled.
+        """
+        destination = _destination(pgw_addr, job, grouping_key)
+        with self._lock:
+            try:
+                self._replay(max_batches=1)
+                if not self._entries:
+                    push_registry(
+                        pgw_addr,
+                        job,
+                        registry,
+                        handler=self.handler,
+                        grouping_key=grouping_key,
+                    )
+                    return True
+            except Exception as e:
+                if not self._entries:
+                    print(
+                        f"gangplank: spooling pushes to {self.path} while the "
+                        f"Pushgateway is unavailable: {e}",
+                        file=sys.stderr,
+                    )
+            self._append(destination, registry)
+            self._update_metrics()
+            return False
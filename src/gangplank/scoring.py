@@ -0,0 +1,255 @@
+"""
+This module provides the BatchScorer class that runs a model over datasets that are
+larger than memory, e.g. in offline batch scoring jobs.
+
+Inputs are read from memory-mapped `.npy` files, arrays or iterables of batches and
+predictions are written to a memory-mapped `.npy` file. Reading, inference and writing
+run concurrently, connected by bounded queues, so that the model is kept busy while the
+next batch is read from disk and the previous predictions are written, without ever
+holding more than a few batches in memory.
+
+Classes:
+    BatchScorer:
+        Pipelines reading, inference and writing and exports the throughput, the time
+        that each stage stalls waiting for the others and the occupancy of the queues.
+
+Dependencies:
+    - numpy
+    - prometheus_client
+    - threading
+"""
+
+import queue
+import threading
+import time
+
+import numpy as np
+import prometheus_client
+
+# Marks the end of a stream of batches.
+_END = object()
+
+# How often a blocked stage checks whether the pipeline has been aborted.
+_POLL_SECONDS = 0.1
+
+
+class _Aborted(Exception):
+    pass
+
+
+class _Stage:
+    """
+    The queue operations of a pipeline stage, which record the time that the stage
+    is blocked and the occupancy of the queues.
+    """
+
+    def __init__(self, scorer, name, abort):
+        self.stall_time = scorer.stall_time.labels(name)
+        self.occupancy = scorer.occupancy
+        self.abort = abort
+
+    def get(self, q, queue_name):
+        start = time.perf_counter()
+        while True:
+            try:
+                item = q.get(timeout=_POLL_SECONDS)
+                break
+            except queue.Empty:
+                if self.abort.is_set():
+                    raise _Aborted()
+        self.stall_time.inc(time.perf_counter() - start)
+        self.occupancy.labels(queue_name).set(q.qsize())
+        return item
+
+    def put(self, q, queue_name, item):
+        start = time.perf_counter()
+        while True:
+            try:
+                q.put(item, timeout=_POLL_SECONDS)
+                break
+            except queue.Full:
+                if self.abort.is_set():
+                    raise _Aborted()
+        self.stall_time.inc(time.perf_counter() - start)
+        self.occupancy.labels(queue_name).set(q.qsize())
+
+
+class BatchScorer:
+    """
+    Runs a model over a dataset in batches, overlapping reading, inference and writing.
+
+    Args:
+        model: The model; usually a PrometheusModel so that the inference metrics are
+            also recorded. The model's `predict` method is called for every batch.
+        batch_size (int, optional): The number of rows per batch. Defaults to 1024.
+        queue_size (int, optional): The maximum number of batches buffered between
+            stages. Defaults to 4.
+        registry (prometheus_client.CollectorRegistry, optional): The Prometheus
+            registry to use for metrics. Defaults to prometheus_client.REGISTRY.
+
+    The following metrics are exported:
+        - `gangplank_scoring_rows_total`: The number of rows scored.
+        - `gangplank_scoring_rows_per_second`: The throughput of the current (or last)
+            call to `score`.
+        - `gangplank_scoring_stall_seconds_total{stage}`: The time that the `read`,
+            `predict` and `write` stages have been blocked waiting for another stage.
+        - `gangplank_scoring_queue_occupancy{queue}`: The number of batches in the
+            `input` and `output` queues.
+    """
+
+    def __init__(
+        self,
+        model,
+        batch_size=1024,
+        queue_size=4,
+        registry=prometheus_client.REGISTRY,
+    ):
+        self.model = model
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.rows = prometheus_client.Counter(
+            "gangplank_scoring_rows_total",
+            "The number of rows scored",
+            registry=registry,
+        )
+        self.throughput = prometheus_client.Gauge(
+            "gangplank_scoring_rows_per_second",
+            "The number of rows scored per second",
+            registry=registry,
+        )
+        self.stall_time = prometheus_client.Counter(
+            "gangplank_scoring_stall_seconds",
+            "The time that a scoring stage was blocked waiting for another stage",
+            labelnames=("stage",),
+            registry=registry,
+        )
+        self.occupancy = prometheus_client.Gauge(
+            "gangplank_scoring_queue_occupancy",
+            "The number of batches waiting in a scoring queue",
+            labelnames=("queue",),
+            registry=registry,
+        )
+
+    def _batches(self, inputs):
+        if isinstance(inputs, np.ndarray):
+            for start in range(0, len(inputs), self.batch_size):
+                # Copying the slice of a memory-mapped array reads it from disk on the
+                # reader thread rather than in the model. (ascontiguousarray would
+                # return a view of a contiguous slice, which still maps the file.)
+                yield np.array(inputs[start : start + self.batch_size], copy=True)
+        else:
+            for batch in inputs:
+                yield np.asarray(batch)
+
+    def _read(self, inputs, input_queue, stage, errors):
+        try:
+            for batch in self._batches(inputs):
+                stage.put(input_queue, "input", batch)
+            stage.put(input_queue, "input", _END)
+        except _Aborted:
+            pass
+        except Exception as e:
+            errors.append(e)
+            stage.abort.set()
+
+    def _write(self, output_queue, stage, errors):
+        try:
+            while True:
+                item = stage.get(output_queue, "output")
+                if item is _END:
+                    return
+                outputs, offset, y = item
+                outputs[offset : offset + len(y)] = y
+        except _Aborted:
+            pass
+        except Exception as e:
+            errors.append(e)
+            stage.abort.set()
+
+    def score(self, inputs, output_path=None, num_rows=None):
+        """
+        Scores a dataset.
+
+        Args:
+            inputs: The inputs. Either the path of a `.npy` file, which is
+                memory-mapped, an array (including a memory-mapped array) that is
+                scored in batches of `batch_size` rows or an iterable of batches; e.g.
+                a generator.
+            output_path (str, optional): The path of the `.npy` file to which the
+                predictions are written through a memory map. If None, the predictions
+                are returned in an in-memory array.
+            num_rows (int, optional): The total number of rows. This is required for an
+                iterable of batches, whose length can't otherwise be known before the
+                output file is created.
+
+        Returns:
+            ndarray: The predictions; a memory-mapped array if `output_path` is given.
+        """
+        if isinstance(inputs, str):
+            inputs = np.load(inputs, mmap_mode="r")
+        if isinstance(inputs, np.ndarray):
+            num_rows = len(inputs)
+        elif num_rows is None:
+            raise ValueError("num_rows is required when the inputs are an iterable.")
+
+        abort = threading.Event()
+        errors = []
+        input_queue = queue.Queue(self.queue_size)
+        output_queue = queue.Queue(self.queue_size)
+        reader_stage = _Stage(self, "read", abort)
+        predict_stage = _Stage(self, "predict", abort)
+        writer_stage = _Stage(self, "write", abort)
+        reader = threading.Thread(
+            target=self._read,
+            args=(inputs, input_queue, reader_stage, errors),
+            name="gangplank-scoring-reader",
+            daemon=True,
+        )
+        writer = threading.Thread(
+            target=self._write,
+            args=(output_queue, writer_stage, errors),
+            name="gangplank-scoring-writer",
+            daemon=True,
+        )
+        reader.start()
+        writer.start()
+
+        outputs = None
+        offset = 0
+        start_time = time.perf_counter()
+        try:
+            while True:
+                x = predict_stage.get(input_queue, "input")
+                if x is _END:
+                    break
+                y = np.asarray(self.model.predict(x, batch_size=len(x), verbose=0))
+                if outputs is None:
+                    shape = (num_rows,) + y.shape[1:]
+                    if output_path is None:
+                        outputs = np.empty(shape, dtype=y.dtype)
+                    else:
+                        outputs = np.lib.format.open_memmap(
+                            output_path, mode="w+", dtype=y.dtype, shape=shape
+                        )
+                if offset + len(y) > num_rows:
+                    raise ValueError(f"the inputs have more than {num_rows} rows.")
+                predict_stage.put(output_queue, "output", (outputs, offset, y))
+                offset += len(y)
+                self.rows.inc(len(y))
+                self.throughput.set(offset / (time.perf_counter() - start_time))
+            predict_stage.put(output_queue, "output", _END)
+        except _Aborted:
+            pass
+        except BaseException:
+            abort.set()
+            raise
+        finally:
+            reader.join()
+            writer.join()
+        if errors:
+            raise errors[0]
+        if offset != num_rows:
+            raise ValueError(f"expected {num_rows} rows but the inputs had {offset}.")
+        if isinstance(outputs, np.memmap):
+            outputs.flush()
+        return outputs
@@ -0,0 +1,154 @@
+"""
+This module provides the QuantileSketch class, a mergeable, constant-memory summary of
+a stream of values from which quantiles can be estimated.
+
+Classes:
+    QuantileSketch:
+        A sketch with logarithmically spaced bins, in the style of DDSketch, that
+        estimates quantiles to within a configurable relative accuracy. Values are
+        added with vectorized NumPy operations.
+
+Dependencies:
+    - numpy
+"""
+
+import math
+
+import numpy as np
+
+
+class QuantileSketch:
+    """
+    A mergeable quantile sketch with a fixed number of bins.
+
+    Values whose magnitude is in the range [min_value, max_value] are assigned to bins
+    whose width grows geometrically so that any quantile is estimated to within the
+    relative accuracy. Magnitudes below min_value are counted as zero and magnitudes
+    above max_value are counted in the outermost bins.
+
+    Args:
+        relative_accuracy (float, optional): The relative accuracy of the estimated
+            quantiles. Defaults to 0.01.
+        min_value (float, optional): The smallest distinguishable magnitude. Defaults
+            to 1e-9.
+        max_value (float, optional): The largest distinguishable magnitude. Defaults to
+            1e9.
+    """
+
+    def __init__(self, relative_accuracy=0.01, min_value=1e-9, max_value=1e9):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("the relative accuracy must be in the range (0, 1).")
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.max_value = max_value
+        gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(gamma)
+        self._min_key = math.ceil(math.log(min_value) / self._log_gamma)
+        max_key = math.ceil(math.log(max_value) / self._log_gamma)
+        keys = np.arange(self._min_key, max_key + 1)
+        # The estimate for a bin is the value with the same relative error to the
+        # bin's lower and upper bounds.
+        self._bin_values = 2 * np.power(gamma, keys) / (gamma + 1)
+        self.positive_counts = np.zeros(len(keys), dtype=np.int64)
+        self.negative_counts = np.zeros(len(keys), dtype=np.int64)
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+
+    def _bins(self, magnitudes):
+        keys = np.ceil(np.log(magnitudes) / self._log_gamma).astype(np.int64)
+        return np.clip(keys - self._min_key, 0, len(self._bin_values) - 1)
+
+    def update(self, values):
+        """
+        Adds values to the sketch. NaNs are ignored.
+
+        Args:
+            values (array_like): The values to add; the array is flattened.
+        """
+        values = np.ravel(np.asarray(values, dtype=np.float64))
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        n_bins = len(self._bin_values)
+        positive = values[values > self.min_value]
+        if positive.size:
+            self.positive_counts += np.bincount(self._bins(positive), minlength=n_bins)
+        negative = values[values < -self.min_value]
+        if negative.size:
+            self.negative_counts += np.bincount(self._bins(-negative), minlength=n_bins)
+        self.zero_count += values.size - positive.size - negative.size
+        self.count += values.size
+        self.sum += float(values.sum())
+
+    def merge(self, other):
+        """
+        Adds the values summarized by another sketch with the same configuration.
+
+        Args:
+            other (QuantileSketch): The sketch to merge into this sketch.
+        """
+        if (
+            other.relative_accuracy != self.relative_accuracy
+            or other.min_value != self.min_value
+            or other.max_value != self.max_value
+        ):
+            raise ValueError("cannot merge sketches with different configurations.")
+        self.positive_counts += other.positive_counts
+        self.negative_counts += other.negative_counts
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+
+    def clear(self):
+        """
+        Removes all values from the sketch.
+        """
+        self.positive_counts[:] = 0
+        self.negative_counts[:] = 0
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+
+    def ordered_counts(self):
+        """
+        Returns the bin counts ordered from the most negative to the most positive bin.
+        Sketches with the same configuration have aligned bins so that, e.g., their
+        cumulative distributions can be compared.
+        """
+        return np.concatenate(
+            (self.negative_counts[::-1], [self.zero_count], self.positive_counts)
+        )
+
+    def ordered_values(self):
+        """
+        Returns the estimated values of the bins in the order of `ordered_counts`.
+        """
+        return np.concatenate((-self._bin_values[::-1], [0.0], self._bin_values))
+
+    def quantiles(self, qs):
+        """
+        Estimates quantiles of the values added to the sketch.
+
+        Args:
+            qs (array_like): The quantiles to estimate, each in the range [0, 1].
+
+        Returns:
+            ndarray: The estimated quantiles or NaNs if the sketch is empty.
+        """
+        qs = np.asarray(qs, dtype=np.float64)
+        if self.count == 0:
+            return np.full(qs.shape, np.nan)
+        cumulative = np.cumsum(self.ordered_counts())
+        ranks = qs * (self.count - 1)
+        indices = np.searchsorted(cumulative, ranks, side="right")
+        return self.ordered_values()[indices]
+
+    def quantile(self, q):
+        """
+        Estimates a single quantile of the values added to the sketch.
+
+        Args:
+            q (float): The quantile to estimate, in the range [0, 1].
+        """
+        return float(self.quantiles([q])[0])
@@ -15,6 +15,7 @@ Constants:
 
 Dependencies:
     - keras
+    - numpy
     - prometheus_client
 
 Usage:
@@ -24,12 +25,24 @@ Usage:
 """
 
 import keras
+import numpy as np
 
+import collections.abc
 import numbers
 import sys
 import time
 import traceback
-from prometheus_client import CollectorRegistry, Gauge, Histogram, push_to_gateway
+import weakref
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+
+from .distributed import worker_info
+from .layer_stats import (
+    UPDATE_RATIO,
+    LayerHistograms,
+    LayerStatistics,
+    check_gradient_backend,
+)
+from .pushgateway import AsyncPusher, PushSpool, push_registry
 
 # Histogram buckets in the interval [-1.0, +1.0] for a model's weights.
 HISTOGRAM_WEIGHT_BUCKETS_1_0 = [
@@ -75,6 +88,102 @@ HISTOGRAM_WEIGHT_BUCKETS_0_3 = [
 ]
 
 
+# The number of weights binned per NumPy pass when constructing a weights histogram.
+_OBSERVE_CHUNK_SIZE = 1 << 20
+
+
+def _observe_many(histogram, values):
+    """
+    Observes every value in an array with a single vectorized pass.
+
+    This is equivalent to calling `histogram.observe(v)` for each value but bins the
+    values with NumPy and then updates the histogram's bucket counts and sum once.
+
+    Args:
+        histogram (prometheus_client.Histogram): The (unlabelled) histogram to update.
+        values (ndarray): The values to observe; the array is flattened.
+    """
+    values = np.ravel(values)
+    upper_bounds = np.asarray(histogram._upper_bounds)
+    if np.issubdtype(values.dtype, np.floating):
+        # Histogram.observe compares a NumPy scalar against the bucket bounds in the
+        # scalar's precision, so we do the same.
+        upper_bounds = upper_bounds.astype(values.dtype)
+    counts = np.zeros(len(upper_bounds) + 1, dtype=np.int64)
+    total = 0.0
+    # Binning in chunks bounds the size of the temporary index arrays.
+    for start in range(0, values.size, _OBSERVE_CHUNK_SIZE):
+        chunk = values[start : start + _OBSERVE_CHUNK_SIZE]
+        # Histogram.observe increments the first bucket whose upper bound is greater
+        # than or equal to the value; searchsorted with side="left" does the same.
+        # NaNs land past the last bucket and, as with observe, are not counted.
+        indices = np.searchsorted(upper_bounds, chunk, side="left")
+        counts += np.bincount(indices, minlength=len(counts))
+        total += float(chunk.sum(dtype=np.float64))
+    if values.size:
+        histogram._sum.inc(total)
+    for bucket, count in zip(histogram._buckets, counts[:-1]):
+        if count:
+            bucket.inc(int(count))
+
+
+class _TimedIterator:
+    """
+    An iterator that adds the time that it blocks for each element to an exporter's
+    total read time.
+    """
+
+    __slots__ = ("iterator", "exporter")
+
+    def __init__(self, iterator, exporter):
+        self.iterator = iterator
+        self.exporter = exporter
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            return next(self.iterator)
+        finally:
+            self.exporter._step_read_time += time.perf_counter() - start
+
+
+class _TimedTrainFunction:
+    """
+    Wraps a model's train function to time how long each step blocks reading its batch.
+
+    Only a train function whose last argument is the data iterator (as with the JAX
+    backend) has its reads timed; any other call is passed through unchanged. The
+    wrapper only times steps that the exporter has begun and removes itself from the
+    model as soon as it is called for any other step; e.g. in a later `fit` after one
+    that raised before `on_train_end`. It holds the exporter through a weak reference.
+    """
+
+    __slots__ = ("train_function", "model", "exporter")
+
+    def __init__(self, train_function, model, exporter):
+        self.train_function = train_function
+        self.model = model
+        self.exporter = weakref.ref(exporter)
+
+    def __call__(self, *args):
+        exporter = self.exporter()
+        if exporter is None or not exporter._step_begun:
+            self.remove()
+            return self.train_function(*args)
+        exporter._step_begun = False
+        if not args or not isinstance(args[-1], collections.abc.Iterator):
+            return self.train_function(*args)
+        *args, iterator = args
+        return self.train_function(*args, _TimedIterator(iterator, exporter))
+
+    def remove(self):
+        if self.model.train_function is self:
+            self.model.train_function = self.train_function
+
+
 class TrainTestExporter(keras.callbacks.Callback):
     """
     Initializes the exporter with configuration for Prometheus metrics collection.
@@ -87,6 +196,80 @@ class TrainTestExporter(keras.callbacks.Callback):
         handler (optional): An authentication handler for the gateway.
         ignore_exceptions (bool, optional): Whether to ignore exceptions during metric
             export. Defaults to True.
+        async_push (bool, optional): If True, metrics are pushed from a background
+            thread so that training is not blocked by the Pushgateway. Pending pushes
+            are coalesced, failed pushes are retried and all metrics are flushed when
+            training or testing ends. Defaults to False.
+        batch_metrics (bool, optional): If True, metrics are also reported at the end of
+            every training and testing batch as `gangplank_train_batch_*` and
+            `gangplank_test_batch_*` gauges. Defaults to False.
+        batch_push_interval (float, optional): When reporting batch metrics, the minimum
+            number of seconds between pushes. Defaults to 60.
+        batch_push_every (int, optional): When reporting batch metrics, push after this
+            many batches even if `batch_push_interval` has not elapsed.
+        layer_stats (bool, optional): If True, per-layer statistics are computed on the
+            training device at the end of every `layer_stats_every` epochs and exported
+            as `gangplank_train_layer_weight_norm`, `gangplank_train_layer_update_ratio`
+            and, if `layer_stats_data` is given, `gangplank_train_layer_gradient_norm`
+            and `gangplank_train_layer_dead_relu_fraction` gauges with a `layer` label.
+            Defaults to False.
+        layer_stats_every (int, optional): The number of epochs between computations
+            of the layer statistics. Defaults to 1.
+        layer_filter (str or Callable[[keras.layers.Layer], bool], optional): Selects
+            the layers for which statistics are computed: a regular expression that is
+            searched for in the layer names or a predicate. Defaults to all layers.
+        layer_stats_data (tuple, optional): A small probe batch `(x, y)` for which the
+            loss gradients and ReLU activations are computed. Gradients are supported
+            with the JAX, TensorFlow and torch backends; with any other backend, a
+            NotImplementedError is raised.
+        layer_histograms_every (int, optional): If given, a histogram of the weights of
+            each layer selected by `layer_filter` is exported, as
+            `gangplank_train_layer_weights` with a `layer` label, at the end of every
+            `layer_histograms_every` epochs. The buckets adapt to each layer's range.
+        layer_histogram_buckets (int, optional): The number of buckets per layer
+            histogram. Defaults to 20.
+        layer_histogram_sample_size (int, optional): If given, the histogram of a
+            layer with more weights than this is computed from a fixed, seeded sample
+            of this many weights so that the cost is bounded for large layers.
+        distributed (bool, optional): If True, the exporter is run by every worker of
+            a multi-worker training job (see gangplank.distributed) and only the chief
+            pushes the job's metrics. The losses and metrics in Keras's logs have
+            already been reduced over the workers by the distribution strategy.
+            Defaults to False.
+        worker_metrics (bool, optional): If True, every worker also pushes its own
+            throughput, as `gangplank_train_worker_steps_per_second` and
+            `gangplank_train_worker_step_time_seconds` gauges, to a group with an
+            additional `worker` grouping label. Defaults to False.
+        step_metrics (bool, optional): If True, the duration of every training step
+            (from the beginning of a batch to its end) is recorded in a
+            `gangplank_train_step_seconds` histogram and the training time is split
+            into `gangplank_train_data_wait_seconds_total` and
+            `gangplank_train_compute_seconds_total`, with the fraction of the last
+            epoch spent waiting for data as `gangplank_train_data_wait_ratio`. The
+            data wait is the time between the end of a batch and the beginning of the
+            next (which, with the torch backend, includes reading the batch) plus, with
+            the JAX backend, the time that a step blocks reading its batch. The
+            TensorFlow backend reads the batch in the compiled train function, so its
+            reads can't be timed. The step durations are observed in memory and only
+            pushed at the end of each epoch. With `worker_metrics`, they are pushed in
+            the worker's group. Defaults to False.
+        step_time_buckets (list of float, optional): The histogram buckets, in
+            seconds, for the step durations.
+        batch_size (int, optional): The training batch size. If given with
+            `step_metrics`, the training throughput of the last epoch is exported as
+            `gangplank_train_samples_per_second`.
+        spool_path (str, optional): If given, pushes that fail because the Pushgateway
+            is unavailable are appended to a spool file at this path, instead of being
+            lost or aborting training, and replayed in order once the gateway is
+            available again (see gangplank.pushgateway.PushSpool). A spool left by a
+            previous run is replayed by the first push. Every process needs its own
+            path. The spool's depth and replay lag are exported as
+            `gangplank_push_spool_*` metrics.
+        spool_max_bytes (int, optional): The maximum size of the spool. Defaults to
+            64 MiB.
+        spool_replay_batch_size (int, optional): The number of spooled pushes that are
+            replayed by each push, so that a long backlog doesn't stall an epoch.
+            Defaults to 100.
     """
 
     def __init__(
@@ -97,6 +280,25 @@ class TrainTestExporter(keras.callbacks.Callback):
         histogram_buckets=None,
         handler=None,
         ignore_exceptions=True,
+        async_push=False,
+        batch_metrics=False,
+        batch_push_interval=60.0,
+        batch_push_every=None,
+        layer_stats=False,
+        layer_stats_every=1,
+        layer_filter=None,
+        layer_stats_data=None,
+        layer_histograms_every=None,
+        layer_histogram_buckets=20,
+        layer_histogram_sample_size=None,
+        distributed=False,
+        worker_metrics=False,
+        step_metrics=False,
+        step_time_buckets=Histogram.DEFAULT_BUCKETS,
+        batch_size=None,
+        spool_path=None,
+        spool_max_bytes=64 * 2**20,
+        spool_replay_batch_size=100,
     ):
         super().__init__()
         self.pgw_addr = pgw_addr
@@ -105,12 +307,83 @@ class TrainTestExporter(keras.callbacks.Callback):
         self.histogram_buckets = histogram_buckets
         self.handler = handler
         self.ignore_exceptions = ignore_exceptions
+        self.async_push = async_push
+        self.pusher = None
         self.registry = CollectorRegistry()
+        self.spool = None
+        if spool_path is not None:
+            self.spool = PushSpool(
+                spool_path,
+                spool_max_bytes,
+                spool_replay_batch_size,
+                handler=handler,
+                registry=self.registry,
+            )
         self.gauges = {}
         self.is_done = False
         # We need to distinguish between training and testing.
         # We'll set this to True if on_training_start is called.
         self.is_training = False
+        self.batch_metrics = batch_metrics
+        self.batch_push_interval = batch_push_interval
+        self.batch_push_every = batch_push_every
+        self.batch_count = 0
+        self._bound_gauges = {}
+        # The gauge prefix and batch count gauge name for each stage, built once
+        # rather than on every batch.
+        self._batch_names = {
+            stage: (f"gangplank_{stage}_batch_", f"gangplank_{stage}_batches_count")
+            for stage in ("train", "test")
+        }
+        self._batch_count_gauge = None
+        self._epoch_gauges = None
+        self._params_count = None
+        self._params_model = None
+        self._batches_since_push = 0
+        # Set when training or testing begins.
+        self._last_push_time = None
+        self.layer_stats = layer_stats
+        self.layer_stats_every = layer_stats_every
+        self.layer_filter = layer_filter
+        self.layer_stats_data = layer_stats_data
+        if layer_stats and layer_stats_data is not None:
+            # Checked once here rather than failing at the end of every epoch.
+            check_gradient_backend()
+        self._layer_statistics = None
+        self._layer_gauges = {}
+        self.layer_histograms_every = layer_histograms_every
+        self.layer_histogram_buckets = layer_histogram_buckets
+        self.layer_histogram_sample_size = layer_histogram_sample_size
+        self._layer_histograms = None
+        self.distributed = distributed
+        self.worker_metrics = worker_metrics
+        self.worker_pusher = None
+        self.worker_registry = None
+        self._worker_info = None
+        self._worker_gauges = None
+        self._epoch_start_time = None
+        self._epoch_start_step = None
+        self.step_metrics = step_metrics
+        self.step_time_buckets = step_time_buckets
+        self.batch_size = batch_size
+        self._step_metrics = None
+        self._step_count = 0
+        self._step_time = 0.0
+        self._step_read_time = 0.0
+        self._batch_gap_time = 0.0
+        self._step_histogram = None
+        self._train_function = None
+        self._step_begun = False
+        self._batch_begin_time = None
+        self._batch_end_time = None
+        # Keras only dispatches batch callbacks asynchronously if no callback
+        # overrides the batch hooks, so we only install them when asked to.
+        if batch_metrics:
+            self.on_train_batch_end = self._on_train_batch_end
+            self.on_test_batch_end = self._on_test_batch_end
+        if step_metrics:
+            self.on_train_batch_begin = self._on_train_batch_begin
+            self.on_train_batch_end = self._on_timed_train_batch_end
 
     @staticmethod
     def _exception_handler(func):
@@ -140,13 +413,183 @@ class TrainTestExporter(keras.callbacks.Callback):
             self.gauges[name] = Gauge(name, desc, registry=self.registry)
         return self.gauges[name]
 
+    def _bind_gauges(self, prefix, logs):
+        return [(k, self._get_gauge(prefix + k, k)) for k in self._get_metrics(logs)]
+
+    def _set_metric_gauges(self, prefix, logs):
+        # The metric names and their gauges are resolved once and only re-resolved
+        # if the logged keys change, so this doesn't build gauge names or look up
+        # gauges on every call. Comparing a frozenset with the keys view doesn't
+        # allocate.
+        bound = self._bound_gauges.get(prefix)
+        if bound is None or bound[0] != logs.keys():
+            bound = (frozenset(logs), self._bind_gauges(prefix, logs))
+            self._bound_gauges[prefix] = bound
+        for k, gauge in bound[1]:
+            v = logs.get(k)
+            if v is not None:
+                gauge.set(v)
+
+    def _count_params(self):
+        # The number of weights is constant once the model has been built.
+        if self._params_model is not self.model:
+            self._params_count = self.model.count_params()
+            self._params_model = self.model
+        return self._params_count
+
+    def _update_batch_metrics(self, stage, logs):
+        if logs is None:
+            logs = {}
+        prefix, count_name = self._batch_names[stage]
+        self._set_metric_gauges(prefix, logs)
+        if self._batch_count_gauge is None:
+            self._batch_count_gauge = self._get_gauge(
+                count_name,
+                "The number of completed batches",
+            )
+        self.batch_count += 1
+        self._batch_count_gauge.set(self.batch_count)
+
+        self._batches_since_push += 1
+        if self.batch_push_every and self._batches_since_push >= self.batch_push_every:
+            self._push_to_gateway()
+        elif (
+            self.batch_push_interval is not None
+            and time.monotonic() - self._last_push_time >= self.batch_push_interval
+        ):
+            self._push_to_gateway()
+
+    def _get_worker_info(self):
+        if self._worker_info is None:
+            self._worker_info = worker_info()
+        return self._worker_info
+
+    def _pushes_job_metrics(self):
+        return not self.distributed or self._get_worker_info().is_chief
+
+    def _push_registry(self, registry, grouping_key=None):
+        if self.spool is not None:
+            self.spool.push(self.pgw_addr, self.job, registry, grouping_key)
+            return
+        push_registry(
+            self.pgw_addr,
+            self.job,
+            registry,
+            handler=self.handler,
+            grouping_key=grouping_key,
+        )
+
+    def _push_worker_registry(self, registry):
+        self._push_registry(registry, {"worker": self._get_worker_info().worker})
+
+    def _reset_push_schedule(self):
+        # Batch pushes are rate-limited from the start of the run, not from the
+        # callback's construction.
+        self._batches_since_push = 0
+        self._last_push_time = time.monotonic()
+
     def _push_to_gateway(self):
-        if self.handler:
-            push_to_gateway(
-                self.pgw_addr, self.job, self.registry, handler=self.handler
+        self._reset_push_schedule()
+        if self._pushes_job_metrics():
+            if not self.async_push:
+                self._push_registry(self.registry)
+            else:
+                if self.pusher is None:
+                    self.pusher = AsyncPusher(
+                        self._push_registry, ignore_exceptions=self.ignore_exceptions
+                    )
+                self.pusher.submit(self.registry)
+        if self.worker_registry is not None:
+            if not self.async_push:
+                self._push_worker_registry(self.worker_registry)
+            else:
+                if self.worker_pusher is None:
+                    self.worker_pusher = AsyncPusher(
+                        self._push_worker_registry,
+                        ignore_exceptions=self.ignore_exceptions,
+                    )
+                self.worker_pusher.submit(self.worker_registry)
+
+    def _close_pusher(self):
+        if self.pusher is not None:
+            self.pusher.close()
+        if self.worker_pusher is not None:
+            self.worker_pusher.close()
+
+    def _training_step(self):
+        # The optimizer counts the steps that have been applied; reading it copies a
+        # single scalar from the device.
+        return int(keras.ops.convert_to_numpy(self.model.optimizer.iterations))
+
+    def _get_worker_registry(self):
+        if self.worker_registry is None:
+            self.worker_registry = CollectorRegistry()
+        return self.worker_registry
+
+    def _update_worker_metrics(self):
+        if self._worker_gauges is None:
+            self._get_worker_registry()
+            self._worker_gauges = (
+                Gauge(
+                    "gangplank_train_worker_steps_per_second",
+                    "The number of training steps per second of a worker",
+                    registry=self.worker_registry,
+                ),
+                Gauge(
+                    "gangplank_train_worker_step_time_seconds",
+                    "The mean duration of a worker's training steps in the last epoch",
+                    registry=self.worker_registry,
+                ),
+            )
+        now = time.monotonic()
+        step = self._training_step()
+        steps = step - self._epoch_start_step
+        elapsed = now - self._epoch_start_time
+        steps_gauge, step_time_gauge = self._worker_gauges
+        if elapsed > 0:
+            steps_gauge.set(steps / elapsed)
+        if steps > 0:
+            step_time_gauge.set(elapsed / steps)
+
+    def _update_layer_stats(self):
+        first_computation = (
+            self._layer_statistics is None
+            or self._layer_statistics.model is not self.model
+        )
+        if first_computation:
+            self._layer_statistics = LayerStatistics(
+                self.model, self.layer_filter, self.layer_stats_data
+            )
+        for layer, statistic, value in self._layer_statistics.compute():
+            if first_computation and statistic == UPDATE_RATIO:
+                # There is no update ratio until the second computation. Other NaNs,
+                # e.g. of a diverging layer, are exported.
+                continue
+            gauge = self._layer_gauges.get(statistic)
+            if gauge is None:
+                gauge = self._layer_gauges[statistic] = Gauge(
+                    "gangplank_train_layer_" + statistic,
+                    "The " + statistic.replace("_", " ") + " of a layer",
+                    labelnames=("layer",),
+                    registry=self.registry,
+                )
+            gauge.labels(layer).set(value)
+
+    def _update_layer_histograms(self):
+        if (
+            self._layer_histograms is None
+            or self._layer_histograms.model is not self.model
+        ):
+            if self._layer_histograms is not None:
+                self.registry.unregister(self._layer_histograms)
+            self._layer_histograms = LayerHistograms(
+                self.model,
+                self.layer_filter,
+                self.layer_histogram_buckets,
+                self.layer_histogram_sample_size,
             )
-        else:
-            push_to_gateway(self.pgw_addr, self.job, self.registry)
+            self.registry.register(self._layer_histograms)
+        self._layer_histograms.update()
 
     def _construct_histogram(self, name):
         histogram = Histogram(
@@ -158,11 +601,112 @@ class TrainTestExporter(keras.callbacks.Callback):
         for layer in self.model.layers:
             if not layer.trainable:
                 continue
-            weights = layer.get_weights()
-            for weight in weights:
-                weight = weight.flatten()
-                for w in weight:
-                    histogram.observe(w)
+            for weight in layer.get_weights():
+                _observe_many(histogram, weight)
+
+    def _get_step_metrics(self):
+        if self._step_metrics is None:
+            registry = (
+                self._get_worker_registry() if self.worker_metrics else self.registry
+            )
+            self._step_metrics = (
+                Histogram(
+                    "gangplank_train_step_seconds",
+                    "The duration of training steps",
+                    buckets=self.step_time_buckets,
+                    registry=registry,
+                ),
+                Counter(
+                    "gangplank_train_data_wait_seconds",
+                    "The time spent waiting for training data between steps",
+                    registry=registry,
+                ),
+                Counter(
+                    "gangplank_train_compute_seconds",
+                    "The time spent in training steps",
+                    registry=registry,
+                ),
+                Gauge(
+                    "gangplank_train_data_wait_ratio",
+                    "The fraction of the last epoch spent waiting for training data",
+                    registry=registry,
+                ),
+                Gauge(
+                    "gangplank_train_samples_per_second",
+                    "The number of training samples per second in the last epoch",
+                    registry=registry,
+                ),
+            )
+        return self._step_metrics
+
+    def _update_step_metrics(self):
+        _, wait_counter, compute_counter, wait_ratio, throughput = (
+            self._get_step_metrics()
+        )
+        # The time that steps spend reading their batches isn't computation.
+        compute = self._step_time - self._step_read_time
+        wait = self._step_read_time + self._batch_gap_time
+        steps = self._step_count
+        self._step_count = 0
+        self._step_time = self._step_read_time = self._batch_gap_time = 0.0
+        compute_counter.inc(compute)
+        wait_counter.inc(wait)
+        if compute + wait > 0:
+            wait_ratio.set(wait / (compute + wait))
+            if self.batch_size:
+                throughput.set(steps * self.batch_size / (compute + wait))
+
+    def _time_batch_reads(self):
+        # The JAX backend passes the data iterator to the train function, which reads
+        # the batch inside the step. The torch backend reads the batch before the step
+        # begins, so the read is already part of the gap between batches, and the
+        # TensorFlow backend reads it in a compiled function that can't be timed from
+        # Python.
+        if keras.backend.backend() != "jax":
+            return
+        train_function = self.model.train_function
+        if isinstance(train_function, _TimedTrainFunction):
+            # Left behind by a `fit` that raised.
+            train_function.remove()
+            train_function = self.model.train_function
+        if train_function is None:
+            return
+        self._train_function = _TimedTrainFunction(train_function, self.model, self)
+        self.model.train_function = self._train_function
+
+    def _restore_train_function(self):
+        if self._train_function is not None:
+            self._train_function.remove()
+            self._train_function = None
+
+    def _on_train_batch_begin(self, batch, logs=None):
+        now = time.perf_counter()
+        if self._batch_end_time is not None:
+            self._batch_gap_time += now - self._batch_end_time
+        self._batch_begin_time = now
+        self._step_begun = True
+
+    def _on_timed_train_batch_end(self, batch, logs=None):
+        now = time.perf_counter()
+        if self._batch_begin_time is not None and self._step_histogram is not None:
+            step_time = now - self._batch_begin_time
+            self._step_histogram.observe(step_time)
+            self._step_time += step_time
+            self._step_count += 1
+        self._batch_end_time = now
+        if self.batch_metrics:
+            self._on_train_batch_end(batch, logs)
+
+    @_exception_handler
+    def _on_train_batch_end(self, batch, logs=None):
+        self._update_batch_metrics("train", logs)
+
+    @_exception_handler
+    def _on_test_batch_end(self, batch, logs=None):
+        if self.is_training:
+            return
+
+        self._update_batch_metrics("test", logs)
 
     @_exception_handler
     def on_test_begin(self, logs):
@@ -173,6 +717,7 @@ class TrainTestExporter(keras.callbacks.Callback):
             return
 
         self.start_time = time.time()
+        self._reset_push_schedule()
 
     @_exception_handler
     def on_test_end(self, logs):
@@ -181,18 +726,13 @@ class TrainTestExporter(keras.callbacks.Callback):
 
         self.is_done = True
 
-        metrics = self._get_metrics(logs)
-        for k in metrics:
-            v = logs.get(k)
-            if v is not None:
-                gauge = self._get_gauge("gangplank_test_" + k, k)
-                gauge.set(v)
+        self._set_metric_gauges("gangplank_test_", logs)
 
         gauge = self._get_gauge(
             "gangplank_test_model_parameters_count",
             "The number of trainable and non-trainable model weights",
         )
-        gauge.set(self.model.count_params())
+        gauge.set(self._count_params())
 
         gauge = self._get_gauge(
             "gangplank_test_elapsed_time_seconds",
@@ -200,10 +740,13 @@ class TrainTestExporter(keras.callbacks.Callback):
         )
         gauge.set(time.time() - self.start_time)
 
-        if self.histogram_buckets:
+        # Only the chief pushes the job's metrics, so the other workers needn't copy
+        # the weights to the host.
+        if self.histogram_buckets and self._pushes_job_metrics():
             self._construct_histogram("gangplank_test_model_weights")
 
         self._push_to_gateway()
+        self._close_pusher()
 
     @_exception_handler
     def on_train_begin(self, logs):
@@ -212,42 +755,69 @@ class TrainTestExporter(keras.callbacks.Callback):
 
         self.is_training = True
         self.start_time = time.time()
+        self._reset_push_schedule()
+        if self.step_metrics:
+            self._step_histogram = self._get_step_metrics()[0]
+            self._time_batch_reads()
 
     @_exception_handler
-    def on_epoch_end(self, epoch, logs):
-        metrics = self._get_metrics(logs)
-        for k in metrics:
-            v = logs.get(k)
-            if v is not None:
-                gauge = self._get_gauge("gangplank_train_" + k, k)
-                gauge.set(v)
-
-        gauge = self._get_gauge(
-            "gangplank_train_model_parameters_count",
-            "The number of trainable and non-trainable model weights",
-        )
-        gauge.set(self.model.count_params())
-
-        gauge = self._get_gauge(
-            "gangplank_train_epochs_count", "The number of completed training epochs"
-        )
-        gauge.set(epoch + 1)
+    def on_epoch_begin(self, epoch, logs=None):
+        if self.worker_metrics:
+            self._epoch_start_time = time.monotonic()
+            self._epoch_start_step = self._training_step()
+        # The wait for the first batch of an epoch starts now, not at the end of the
+        # previous epoch's last batch (which is followed by validation).
+        self._batch_begin_time = None
+        self._batch_end_time = time.perf_counter()
 
-        gauge = self._get_gauge(
-            "gangplank_train_elapsed_time_seconds",
-            "The amount of time spent training the model",
-        )
-        gauge.set(time.time() - self.start_time)
+    @_exception_handler
+    def on_epoch_end(self, epoch, logs):
+        self._set_metric_gauges("gangplank_train_", logs)
+
+        if self._epoch_gauges is None:
+            self._epoch_gauges = (
+                self._get_gauge(
+                    "gangplank_train_model_parameters_count",
+                    "The number of trainable and non-trainable model weights",
+                ),
+                self._get_gauge(
+                    "gangplank_train_epochs_count",
+                    "The number of completed training epochs",
+                ),
+                self._get_gauge(
+                    "gangplank_train_elapsed_time_seconds",
+                    "The amount of time spent training the model",
+                ),
+            )
+        params_gauge, epochs_gauge, elapsed_gauge = self._epoch_gauges
+        params_gauge.set(self._count_params())
+        epochs_gauge.set(epoch + 1)
+        elapsed_gauge.set(time.time() - self.start_time)
+
+        if self.worker_metrics:
+            self._update_worker_metrics()
+        if self.step_metrics:
+            self._update_step_metrics()
+        # The other workers don't push the job's metrics so they needn't compute the
+        # layer statistics.
+        if self._pushes_job_metrics():
+            if self.layer_stats and (epoch + 1) % self.layer_stats_every == 0:
+                self._update_layer_stats()
+            if (
+                self.layer_histograms_every
+                and (epoch + 1) % self.layer_histograms_every == 0
+            ):
+                self._update_layer_histograms()
 
         self._push_to_gateway()
 
     @_exception_handler
     def on_train_end(self, logs):
         self.is_done = True
+        self._restore_train_function()
 
-        if not self.histogram_buckets:
-            return
-
-        self._construct_histogram("gangplank_train_model_weights")
+        if self.histogram_buckets and self._pushes_job_metrics():
+            self._construct_histogram("gangplank_train_model_weights")
+            self._push_to_gateway()
 
-        self._push_to_gateway()
+        self._close_pusher()
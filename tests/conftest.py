@@ -0,0 +1,88 @@
+"""
+Shared fixtures for the gangplank tests.
+
+The tests run against whichever Keras backend is installed (the `KERAS_BACKEND`
+environment variable, if set, takes precedence) and push to a local stand-in for a
+Prometheus Pushgateway that can be made slow or unavailable.
+"""
+
+import http.server
+import importlib.util
+import os
+import threading
+import time
+
+import pytest
+
+if "KERAS_BACKEND" not in os.environ:
+    for _backend in ("tensorflow", "jax", "torch"):
+        if importlib.util.find_spec(_backend) is not None:
+            os.environ["KERAS_BACKEND"] = _backend
+            break
+
+
+class _GatewayHandler(http.server.BaseHTTPRequestHandler):
+    def _record(self):
+        gateway = self.server.gateway
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(gateway.latency)
+        with gateway.lock:
+            if gateway.failures > 0:
+                gateway.failures -= 1
+                self.send_response(503)
+                self.end_headers()
+                return
+            gateway.pushes.append((self.command, self.path, body.decode()))
+        self.send_response(200)
+        self.end_headers()
+
+    do_PUT = _record
+    do_POST = _record
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInGateway:
+    """
+    A Pushgateway stand-in that records the pushes that it accepts.
+
+    Attributes:
+        address (str): The `host:port` to push to.
+        latency (float): The number of seconds that every push takes.
+        failures (int): The number of pushes to reject with a 503 before accepting
+            pushes again.
+        pushes (list of tuple): The method, path and body of each accepted push.
+    """
+
+    def __init__(self):
+        self.latency = 0.0
+        self.failures = 0
+        self.pushes = []
+        self.lock = threading.Lock()
+        self._server = http.server.ThreadingHTTPServer(
+            ("127.0.0.1", 0), _GatewayHandler
+        )
+        self._server.daemon_threads = True
+        self._server.gateway = self
+        self.address = f"127.0.0.1:{self._server.server_address[1]}"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def samples(self, name, push=-1):
+        """
+        Returns the sample lines of a metric in a push (by default, the last one).
+        """
+        with self.lock:
+            body = self.pushes[push][2]
+        return [line for line in body.splitlines() if line.startswith(name)]
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def gateway():
+    gateway = StandInGateway()
+    yield gateway
+    gateway.close()
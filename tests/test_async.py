@@ -0,0 +1,97 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+import prometheus_client
+
+from gangplank import PrometheusModel
+
+
+class _SlowModel:
+    """
+    A model that sleeps for every prediction and records how many overlap.
+    """
+
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def predict(self, x, *args):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.delay)
+        with self.lock:
+            self.running -= 1
+        return x
+
+    def __call__(self, x):
+        return self.predict(x)
+
+
+def _proxy(model, **kwargs):
+    registry = prometheus_client.CollectorRegistry()
+    return PrometheusModel(model, registry=registry, **kwargs), registry
+
+
+async def _predict_concurrently(proxy, n):
+    x = np.ones((2, 3))
+    return await asyncio.gather(*(proxy.apredict(x) for _ in range(n)))
+
+
+def test_in_flight_gauge_tracks_apredict_invocations():
+    model = _SlowModel(delay=0.1)
+    proxy, registry = _proxy(model, max_concurrency=None)
+
+    async def run():
+        tasks = [asyncio.create_task(proxy.apredict(np.ones((2, 3)))) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        in_flight = registry.get_sample_value("gangplank_predict_in_flight")
+        await asyncio.gather(*tasks)
+        return in_flight
+
+    assert asyncio.run(run()) == 3
+    assert registry.get_sample_value("gangplank_predict_in_flight") == 0
+    assert registry.get_sample_value("gangplank_predict_total") == 6
+
+
+def test_max_concurrency_limits_overlapping_model_calls():
+    for max_concurrency in (1, 2):
+        model = _SlowModel()
+        proxy, _ = _proxy(model, max_concurrency=max_concurrency)
+        asyncio.run(_predict_concurrently(proxy, 8))
+        assert model.max_running == max_concurrency
+
+
+def test_apredict_can_be_used_from_several_event_loops():
+    model = _SlowModel()
+    proxy, registry = _proxy(model)
+    # One loop after another.
+    for _ in range(2):
+        asyncio.run(_predict_concurrently(proxy, 4))
+    # Loops running at the same time in different threads still share the limit.
+    threads = [
+        threading.Thread(target=asyncio.run, args=(_predict_concurrently(proxy, 4),))
+        for _ in range(2)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert model.max_running == 1
+    assert registry.get_sample_value("gangplank_predict_total") == 16 * 2
+
+
+def test_acall_runs_the_model_in_the_executor():
+    model = _SlowModel()
+    proxy, registry = _proxy(model)
+
+    async def run():
+        return await proxy.acall(np.ones((5, 3)))
+
+    assert asyncio.run(run()).shape == (5, 3)
+    assert registry.get_sample_value("gangplank_predict_call_total") == 5
+    assert registry.get_sample_value("gangplank_predict_call_in_flight") == 0
@@ -0,0 +1,117 @@
+import threading
+import time
+
+import numpy as np
+import prometheus_client
+import pytest
+from prometheus_client.openmetrics.exposition import generate_latest
+
+from gangplank import HISTOGRAM_LATENCY_BUCKETS, PrometheusModel
+from gangplank.batching import BatchScheduler
+
+
+class _RecordingModel:
+    """
+    Doubles its inputs and records the size of every batch.
+    """
+
+    def __init__(self, error=None):
+        self.error = error
+        self.batch_sizes = []
+
+    def __call__(self, x, trace_id=None):
+        self.batch_sizes.append(len(x))
+        if self.error is not None:
+            raise self.error
+        return 2 * x
+
+
+def _scheduler(model, max_batch_size, max_wait_ms=50.0):
+    return BatchScheduler(
+        model,
+        max_batch_size,
+        max_wait_ms,
+        registry=prometheus_client.CollectorRegistry(),
+    )
+
+
+def test_predictions_are_scattered_to_their_callers():
+    model = _RecordingModel()
+    scheduler = _scheduler(model, 64)
+    inputs = [np.full((i % 3 + 1, 2), i, dtype=np.float32) for i in range(8)]
+    results = [None] * len(inputs)
+    barrier = threading.Barrier(len(inputs))
+
+    def call(i):
+        barrier.wait()
+        results[i] = scheduler.predict(inputs[i])
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(inputs))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    scheduler.close()
+
+    for x, y in zip(inputs, results):
+        np.testing.assert_array_equal(y, 2 * x)
+    assert sum(model.batch_sizes) == sum(len(x) for x in inputs)
+    assert len(model.batch_sizes) < len(inputs)
+
+
+def test_batches_do_not_exceed_max_batch_size():
+    model = _RecordingModel()
+    scheduler = _scheduler(model, 4, max_wait_ms=1000.0)
+    futures = [scheduler.submit(np.ones((size, 1))) for size in (3, 3, 2, 2, 1)]
+    for future in futures:
+        future.result(timeout=5)
+    scheduler.close()
+    # Requests are never split, so a request that doesn't fit starts a new batch.
+    assert model.batch_sizes == [3, 3, 4, 1]
+
+
+def test_an_exception_is_raised_for_every_request_in_the_batch():
+    error = RuntimeError("model failed")
+    model = _RecordingModel(error)
+    scheduler = _scheduler(model, 3, max_wait_ms=1000.0)
+    futures = [scheduler.submit(np.ones((1, 1))) for _ in range(3)]
+    for future in futures:
+        assert future.exception(timeout=5) is error
+    assert model.batch_sizes == [3]
+    scheduler.close()
+
+
+def test_close_drains_the_queue():
+    model = _RecordingModel()
+    scheduler = _scheduler(model, 100, max_wait_ms=60_000.0)
+    futures = [scheduler.submit(np.full((1, 1), i)) for i in range(5)]
+    start = time.monotonic()
+    scheduler.close()
+    assert time.monotonic() - start < 5
+    assert [future.result(timeout=0).item() for future in futures] == [
+        0,
+        2,
+        4,
+        6,
+        8,
+    ]
+    with pytest.raises(RuntimeError):
+        scheduler.submit(np.ones((1, 1)))
+
+
+def test_a_batched_prediction_keeps_its_trace_id():
+    registry = prometheus_client.CollectorRegistry()
+
+    class Model:
+        def predict(self, x, *args):
+            return x
+
+    proxy = PrometheusModel(
+        Model(),
+        registry=registry,
+        max_batch_size=8,
+        max_wait_ms=1.0,
+        latency_buckets=HISTOGRAM_LATENCY_BUCKETS,
+    )
+    proxy.predict(np.ones((2, 3)), trace_id="abc123")
+    assert 'trace_id="abc123"' in generate_latest(registry).decode()
@@ -0,0 +1,82 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from gangplank.distributed import WorkerInfo, _from_tf_config
+
+_WORKER_SCRIPT = """
+import sys
+
+import keras
+import numpy as np
+
+from gangplank import TrainTestExporter
+
+model = keras.Sequential([keras.Input((4,)), keras.layers.Dense(1)])
+model.compile("sgd", "mse")
+x = np.ones((8, 4), dtype=np.float32)
+y = np.ones((8, 1), dtype=np.float32)
+exporter = TrainTestExporter(
+    sys.argv[1],
+    "job",
+    distributed=True,
+    worker_metrics=True,
+    ignore_exceptions=False,
+)
+model.fit(x, y, epochs=2, verbose=0, callbacks=[exporter])
+"""
+
+
+def _tf_config(task_type, index, chiefs=1, workers=2):
+    cluster = {"worker": [f"worker{i}:2222" for i in range(workers)]}
+    if chiefs:
+        cluster["chief"] = ["chief:2222"]
+    return json.dumps({"cluster": cluster, "task": {"type": task_type, "index": index}})
+
+
+@pytest.mark.parametrize(
+    "tf_config, expected",
+    [
+        (_tf_config("chief", 0), WorkerInfo("0", True, 3)),
+        (_tf_config("worker", 0), WorkerInfo("1", False, 3)),
+        (_tf_config("worker", 1), WorkerInfo("2", False, 3)),
+        (_tf_config("worker", 0, chiefs=0), WorkerInfo("0", True, 2)),
+        (_tf_config("worker", 1, chiefs=0), WorkerInfo("1", False, 2)),
+        (_tf_config("ps", 0), WorkerInfo("ps-0", False, 3)),
+    ],
+)
+def test_tf_config_ranks(tf_config, expected):
+    assert _from_tf_config(tf_config) == expected
+
+
+def test_only_the_chief_pushes_the_job_metrics(gateway):
+    num_workers = 3
+    src = os.path.join(os.path.dirname(__file__), os.pardir, "src")
+    processes = []
+    for index in range(num_workers):
+        env = dict(
+            os.environ,
+            PYTHONPATH=os.path.abspath(src),
+            TF_CONFIG=_tf_config("worker", index, chiefs=0, workers=num_workers),
+        )
+        processes.append(
+            subprocess.Popen(
+                [sys.executable, "-c", _WORKER_SCRIPT, gateway.address], env=env
+            )
+        )
+    for process in processes:
+        assert process.wait(timeout=300) == 0
+
+    with gateway.lock:
+        pushes = list(gateway.pushes)
+    job_pushes = [body for _, path, body in pushes if path == "/metrics/job/job"]
+    # One push per epoch and none from the other workers.
+    assert len(job_pushes) == 2
+    assert all("gangplank_train_epochs_count" in body for body in job_pushes)
+    worker_paths = {path for _, path, _ in pushes if path != "/metrics/job/job"}
+    assert worker_paths == {
+        f"/metrics/job/job/worker/{index}" for index in range(num_workers)
+    }
@@ -0,0 +1,84 @@
+import threading
+import time
+
+import numpy as np
+import prometheus_client
+import pytest
+
+from gangplank import Drift, PrometheusModel
+from gangplank.prometheus_model import _DriftWindow
+
+
+class _Identity:
+    def predict(self, x, *args):
+        return x
+
+
+def _ys(windows):
+    return [window_y.tolist() for _, window_y in windows]
+
+
+def test_a_tumbling_window_is_checked_every_size_predictions():
+    window = _DriftWindow(4)
+    assert window.add(np.arange(3), np.arange(3)) == []
+    assert _ys(window.add(np.arange(3, 10), np.arange(3, 10))) == [
+        [0, 1, 2, 3],
+        [4, 5, 6, 7],
+    ]
+    assert _ys(window.add(np.arange(10, 12), np.arange(10, 12))) == [[8, 9, 10, 11]]
+
+
+def test_a_sliding_window_wraps_around_its_buffers():
+    window = _DriftWindow(4, step=2)
+    y = np.arange(11)
+    x = np.stack([y, -y], axis=1)
+    windows = window.add(x[:5], y[:5]) + window.add(x[5:], y[5:])
+    assert _ys(windows) == [[0, 1, 2, 3], [2, 3, 4, 5], [4, 5, 6, 7], [6, 7, 8, 9]]
+    for window_x, window_y in windows:
+        np.testing.assert_array_equal(window_x, np.stack([window_y, -window_y], 1))
+
+
+def test_a_step_must_not_exceed_the_size():
+    with pytest.raises(ValueError):
+        _DriftWindow(4, step=5)
+
+
+def test_inputs_are_not_kept_if_not_asked_for():
+    window = _DriftWindow(2, keep_inputs=False)
+    ((window_x, window_y),) = window.add(None, np.ones((2, 3)))
+    assert window_x is None
+    assert window_y.shape == (2, 3)
+
+
+def test_a_partial_window_is_due_after_the_interval():
+    window = _DriftWindow(10, interval=0.05)
+    assert window.add(np.arange(2), np.arange(2)) == []
+    assert window.due() is None
+    time.sleep(0.06)
+    assert _ys([window.due()]) == [[0, 1]]
+    # Nothing new has arrived since the check.
+    time.sleep(0.06)
+    assert window.due() is None
+
+
+@pytest.mark.parametrize("drift_async", [False, True])
+def test_a_timer_checks_a_partial_window_during_a_silence(drift_async):
+    checked = []
+    called = threading.Event()
+
+    def drift(x, y):
+        checked.append(len(y))
+        called.set()
+        return Drift()
+
+    proxy = PrometheusModel(
+        _Identity(),
+        registry=prometheus_client.CollectorRegistry(),
+        get_drift_metrics_func=drift,
+        drift_async=drift_async,
+        drift_window_size=100,
+        drift_window_interval=0.05,
+    )
+    proxy.predict(np.ones((3, 2)))
+    assert called.wait(5)
+    assert checked == [3]
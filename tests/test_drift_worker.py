@@ -0,0 +1,110 @@
+import threading
+import time
+
+import numpy as np
+import prometheus_client
+import pytest
+
+from gangplank import Drift, PrometheusModel
+from gangplank.prometheus_model import _DriftWorker
+
+
+class _Identity:
+    def predict(self, x, *args):
+        return x
+
+
+class _BlockingUpdates:
+    """
+    Records the batches that a drift worker passes on, blocking until released.
+    """
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.batches = []
+        self.done = threading.Semaphore(0)
+
+    def __call__(self, x, y):
+        self.started.set()
+        self.release.wait()
+        self.batches.append(int(y))
+        self.done.release()
+
+
+def _worker(update, policy, queue_size=2):
+    registry = prometheus_client.CollectorRegistry()
+    return _DriftWorker(update, queue_size, policy, registry, None), registry
+
+
+def test_the_worker_gets_copies_of_reused_buffers():
+    seen = []
+    checked = threading.Event()
+    release = threading.Event()
+
+    def drift(x, y):
+        release.wait()
+        seen.append((x.copy(), y.copy()))
+        checked.set()
+        return Drift()
+
+    proxy = PrometheusModel(
+        _Identity(),
+        registry=prometheus_client.CollectorRegistry(),
+        get_drift_metrics_func=drift,
+        drift_async=True,
+    )
+    buffer = np.zeros((2, 2))
+    proxy.predict(buffer)
+    # A serving loop reuses its input buffer for the next request.
+    buffer[:] = 1
+    release.set()
+    assert checked.wait(5)
+    ((x, y),) = seen
+    assert not x.any() and not y.any()
+
+
+@pytest.mark.parametrize(
+    "policy, processed", [("drop_newest", [0, 1, 2]), ("drop_oldest", [0, 3, 4])]
+)
+def test_a_full_queue_drops_batches(policy, processed):
+    update = _BlockingUpdates()
+    worker, registry = _worker(update, policy)
+    worker.submit(None, 0)
+    assert update.started.wait(5)
+    for i in range(1, 5):
+        worker.submit(None, i)
+    assert registry.get_sample_value("gangplank_predict_drift_dropped_total") == 2
+    assert registry.get_sample_value("gangplank_predict_drift_queue_depth") == 2
+
+    time.sleep(0.05)
+    update.release.set()
+    for _ in processed:
+        assert update.done.acquire(timeout=5)
+    assert update.batches == processed
+    assert registry.get_sample_value("gangplank_predict_drift_queue_depth") == 0
+    # The last batch waited in the queue while the first was blocked.
+    assert registry.get_sample_value("gangplank_predict_drift_lag_seconds") >= 0.05
+
+
+def test_the_worker_survives_a_failing_drift_function(capsys):
+    calls = []
+    done = threading.Event()
+
+    def update(x, y):
+        calls.append(y)
+        if y == 0:
+            raise ValueError("bad batch")
+        done.set()
+
+    worker, _ = _worker(update, "drop_newest")
+    worker.submit(None, 0)
+    worker.submit(None, 1)
+    assert done.wait(5)
+    assert calls == [0, 1]
+    assert "ValueError: bad batch" in capsys.readouterr().err
+
+
+def test_an_unknown_drop_policy_raises():
+    with pytest.raises(ValueError):
+        _worker(lambda x, y: None, "drop_all")
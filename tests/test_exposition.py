@@ -0,0 +1,140 @@
+import gzip
+import threading
+import time
+import urllib.request
+
+import numpy as np
+import prometheus_client
+import pytest
+from prometheus_client.core import GaugeMetricFamily
+
+from gangplank import HISTOGRAM_LATENCY_BUCKETS, PrometheusModel
+from gangplank.exposition import start_http_server
+from gangplank.prometheus_model import _SlowestExemplars
+
+
+class _SlowCollector:
+    def __init__(self, delay):
+        self.delay = delay
+        self.collections = 0
+
+    def collect(self):
+        self.collections += 1
+        time.sleep(self.delay)
+        yield GaugeMetricFamily("slow", "A slowly collected metric", value=1)
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def serve(registry, ttl):
+        server = start_http_server(0, "127.0.0.1", registry, ttl)
+        servers.append(server)
+        return server
+
+    yield serve
+    for server in servers:
+        server.close()
+
+
+def _get(server, headers=None):
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{server.port}/metrics", headers=headers or {}
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return response.headers, response.read()
+
+
+def _requests(registry, cache):
+    return registry.get_sample_value(
+        "gangplank_scrape_requests_total", {"cache": cache}
+    )
+
+
+def test_scrapes_within_the_ttl_are_served_from_the_cache(serve):
+    registry = prometheus_client.CollectorRegistry()
+    collector = _SlowCollector(0)
+    registry.register(collector)
+    server = serve(registry, ttl=0.2)
+    for _ in range(3):
+        _, body = _get(server)
+        assert b"slow 1.0" in body
+    assert collector.collections == 1
+    assert _requests(registry, "miss") == 1
+    assert _requests(registry, "hit") == 2
+
+    # Reading the request counts collected the registry too.
+    collections = collector.collections
+    time.sleep(0.25)
+    _get(server)
+    assert collector.collections == collections + 1
+    assert _requests(registry, "miss") == 2
+
+
+def test_concurrent_stale_scrapes_share_one_collection(serve):
+    registry = prometheus_client.CollectorRegistry()
+    collector = _SlowCollector(0.2)
+    registry.register(collector)
+    server = serve(registry, ttl=60)
+    bodies = []
+    threads = [
+        threading.Thread(target=lambda: bodies.append(_get(server)[1]))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(bodies) == 8 and len(set(bodies)) == 1
+    assert collector.collections == 1
+    assert registry.get_sample_value("gangplank_scrape_collect_seconds_count") == 1
+
+
+def test_gzip_is_served_if_accepted(serve):
+    registry = prometheus_client.CollectorRegistry()
+    registry.register(_SlowCollector(0))
+    server = serve(registry, ttl=60)
+    headers, body = _get(server, {"Accept-Encoding": "gzip"})
+    assert headers["Content-Encoding"] == "gzip"
+    assert b"slow 1.0" in gzip.decompress(body)
+    headers, body = _get(server)
+    assert headers["Content-Encoding"] is None
+    assert b"slow 1.0" in body
+
+
+def test_openmetrics_is_negotiated_with_exemplars(serve):
+    registry = prometheus_client.CollectorRegistry()
+
+    class Model:
+        def predict(self, x, *args):
+            return x
+
+    proxy = PrometheusModel(
+        Model(), registry=registry, latency_buckets=HISTOGRAM_LATENCY_BUCKETS
+    )
+    proxy.predict(np.ones((2, 2)), trace_id="trace-1")
+    server = serve(registry, ttl=60)
+
+    headers, body = _get(server, {"Accept": "application/openmetrics-text; version=1"})
+    assert headers["Content-Type"].startswith("application/openmetrics-text")
+    assert b'# {trace_id="trace-1"}' in body
+    assert body.endswith(b"# EOF\n")
+    headers, body = _get(server, {"Accept": "text/plain"})
+    assert headers["Content-Type"].startswith("text/plain")
+    assert b"trace-1" not in body
+
+
+def test_the_slowest_exemplar_in_a_bucket_is_kept_for_the_window():
+    exemplars = _SlowestExemplars([0.1, float("inf")], window=0.1)
+    assert exemplars.offer(0.05, "a")
+    assert not exemplars.offer(0.04, "b")
+    assert exemplars.offer(0.06, "c")
+    assert exemplars.exemplars[0].labels == {"trace_id": "c"}
+    # Other buckets are independent.
+    assert exemplars.offer(0.5, "d")
+    # Once the window has passed, the next observation replaces the slowest.
+    time.sleep(0.11)
+    assert exemplars.offer(0.01, "e")
+    assert exemplars.exemplars[0].labels == {"trace_id": "e"}
+    assert exemplars.exemplars[1].labels == {"trace_id": "d"}
@@ -0,0 +1,103 @@
+import time
+
+import keras
+import numpy as np
+import prometheus_client
+import pytest
+
+from gangplank import PrometheusModel
+
+
+@pytest.fixture(scope="module")
+def model():
+    inputs = keras.Input((4,))
+    outputs = keras.layers.Dense(3, activation="softmax")(inputs)
+    return keras.Model(inputs, outputs)
+
+
+def test_models_share_labelled_metric_families(model):
+    registry = prometheus_client.CollectorRegistry()
+    a = PrometheusModel(model, registry=registry, model_name="a", model_version="1")
+    b = PrometheusModel(model, registry=registry, model_name="b", model_version="2")
+    a.predict(np.ones((3, 4), dtype=np.float32), verbose=0)
+    b.predict(np.ones((5, 4), dtype=np.float32), verbose=0)
+
+    def total(name, version):
+        return registry.get_sample_value(
+            "gangplank_predict_total", {"model": name, "version": version}
+        )
+
+    assert total("a", "1") == 3
+    assert total("b", "2") == 5
+
+
+def test_registering_a_model_version_twice_raises(model):
+    registry = prometheus_client.CollectorRegistry()
+    PrometheusModel(model, registry=registry, model_name="a", model_version="1")
+    with pytest.raises(ValueError):
+        PrometheusModel(model, registry=registry, model_name="a", model_version="1")
+
+
+def test_named_models_with_conflicting_options_raise(model):
+    registry = prometheus_client.CollectorRegistry()
+    PrometheusModel(model, registry=registry, model_name="a", latency_buckets=[0.1])
+    with pytest.raises(ValueError):
+        PrometheusModel(model, registry=registry, model_name="b", fast_path=True)
+    with pytest.raises(ValueError):
+        PrometheusModel(model, registry=registry, model_name="b", latency_buckets=[1])
+    PrometheusModel(model, registry=registry, model_name="b", latency_buckets=[0.1])
+
+
+def test_closing_a_model_removes_its_metrics(model):
+    for fast_path in (False, True):
+        registry = prometheus_client.CollectorRegistry()
+        kwargs = {"registry": registry, "model_name": "a", "fast_path": fast_path}
+        old = PrometheusModel(model, model_version="1", **kwargs)
+        old(np.ones((2, 4), dtype=np.float32))
+        old.close()
+        new = PrometheusModel(model, model_version="2", **kwargs)
+        new(np.ones((3, 4), dtype=np.float32))
+        exposition = prometheus_client.generate_latest(registry).decode()
+        assert 'version="1"' not in exposition
+        assert (
+            registry.get_sample_value(
+                "gangplank_predict_call_total", {"model": "a", "version": "2"}
+            )
+            == 3
+        )
+        # The version can be registered again.
+        PrometheusModel(model, model_version="1", **kwargs)
+
+
+def _scrape_seconds(model, n_models):
+    registry = prometheus_client.CollectorRegistry()
+    models = [
+        PrometheusModel(
+            model,
+            registry=registry,
+            model_name=f"m{i}",
+            model_version="1",
+            latency_buckets=[0.01, 0.1],
+        )
+        for i in range(n_models)
+    ]
+    x = np.ones((2, 4), dtype=np.float32)
+    for proxy in models:
+        proxy(x)
+    prometheus_client.generate_latest(registry)
+    start = time.perf_counter()
+    for _ in range(5):
+        prometheus_client.generate_latest(registry)
+    return (time.perf_counter() - start) / 5
+
+
+@pytest.mark.benchmark
+def test_benchmark_scrape_cost_is_linear_in_the_number_of_models(model):
+    seconds = {n: _scrape_seconds(model, n) for n in (100, 400)}
+    print(
+        "\nscrape: "
+        + ", ".join(f"{n} models {s * 1000:.1f} ms" for n, s in seconds.items())
+    )
+    # Four times the models should cost about four times as much. The bound is
+    # loose to tolerate noisy machines while still failing on quadratic cost.
+    assert seconds[400] < 16 * seconds[100]
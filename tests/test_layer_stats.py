@@ -0,0 +1,111 @@
+import keras
+import numpy as np
+import prometheus_client
+import pytest
+
+from gangplank import TrainTestExporter
+from gangplank.layer_stats import LayerHistograms, LayerStatistics
+
+
+def _model(units=8):
+    model = keras.Sequential(
+        [
+            keras.Input((4,)),
+            keras.layers.Dense(units, activation="relu", name="hidden"),
+            keras.layers.Dense(1, name="output"),
+        ]
+    )
+    model.compile("sgd", "mse")
+    return model
+
+
+def _histograms(collector):
+    registry = prometheus_client.CollectorRegistry()
+    registry.register(collector)
+    (family,) = registry.collect()
+    histograms = {}
+    for sample in family.samples:
+        if sample.name.endswith("_bucket"):
+            layer = sample.labels["layer"]
+            histograms.setdefault(layer, {})[sample.labels["le"]] = sample.value
+    return histograms
+
+
+def test_weight_norms_update_ratios_and_dead_relu_fractions():
+    model = _model(units=4)
+    hidden = model.get_layer("hidden")
+    # The inputs are positive, so the units with negative weights are never active.
+    kernel = np.array([[1.0, -1.0, 2.0, -2.0]] * 4, dtype=np.float32)
+    hidden.set_weights([kernel, np.zeros(4, dtype=np.float32)])
+    x = np.random.default_rng(0).random((16, 4), dtype=np.float32) + 0.1
+    y = np.ones((16, 1), dtype=np.float32)
+    statistics = LayerStatistics(model, "hidden", (x, y))
+
+    values = {stat: value for _, stat, value in statistics.compute()}
+    assert values["weight_norm"] == pytest.approx(np.linalg.norm(kernel))
+    assert np.isnan(values["update_ratio"])
+    assert values["gradient_norm"] >= 0
+    assert values["dead_relu_fraction"] == 0.5
+
+    hidden.set_weights([2 * kernel, np.zeros(4, dtype=np.float32)])
+    values = {stat: value for _, stat, value in statistics.compute()}
+    assert values["update_ratio"] == pytest.approx(1.0)
+
+
+def test_an_unsupported_gradient_backend_is_rejected_up_front(monkeypatch):
+    monkeypatch.setattr(keras.backend, "backend", lambda: "numpy")
+    probe = (np.ones((2, 4)), np.ones((2, 1)))
+    with pytest.raises(NotImplementedError):
+        TrainTestExporter(
+            "localhost:9091", "job", layer_stats=True, layer_stats_data=probe
+        )
+    # Without a probe batch, no gradients are computed.
+    TrainTestExporter("localhost:9091", "job", layer_stats=True)
+
+
+def test_bucket_bounds_are_rounded():
+    model = _model()
+    weights = model.get_layer("hidden").get_weights()
+    weights[0] = np.full_like(weights[0], 0.35)
+    model.get_layer("hidden").set_weights(weights)
+    histograms = LayerHistograms(model, "hidden", n_buckets=20)
+    histograms.update()
+    bounds = list(_histograms(histograms)["hidden"])
+    # The largest weight, 0.35, is rounded up to 0.5.
+    assert bounds[:3] == ["-0.45", "-0.4", "-0.35"]
+    assert bounds[-2:] == ["0.45", "+Inf"]
+
+
+def test_a_sampled_layer_is_binned_from_its_sample():
+    model = _model(units=64)
+    histograms = LayerHistograms(model, "hidden", n_buckets=10, sample_size=50)
+    histograms.update()
+    buckets = _histograms(histograms)["hidden"]
+    assert buckets["+Inf"] == 50
+
+    # The same sample, taken from the concatenated weights.
+    layer_weights = np.concatenate(
+        [np.ravel(w) for w in model.get_layer("hidden").get_weights()]
+    )
+    indices = np.concatenate(
+        [i + offset for i, offset in zip(histograms._indices[0], (0, 4 * 64))]
+    )
+    sample = layer_weights[indices]
+    r = float(list(buckets)[-2])
+    assert buckets[list(buckets)[0]] == np.sum(sample <= -r + 2 * r / 10)
+    assert buckets["0.0"] == np.sum(sample <= 0)
+
+
+def test_layer_histograms_follow_a_new_model():
+    exporter = TrainTestExporter("localhost:9091", "job", layer_histograms_every=1)
+    exporter.set_model(_model())
+    exporter._update_layer_histograms()
+    other = keras.Sequential([keras.Input((4,)), keras.layers.Dense(2, name="other")])
+    exporter.set_model(other)
+    exporter._update_layer_histograms()
+    layers = {
+        sample.labels["layer"]
+        for family in exporter.registry.collect()
+        for sample in family.samples
+    }
+    assert layers == {"other"}
@@ -0,0 +1,108 @@
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import prometheus_client
+from prometheus_client import CollectorRegistry, Counter
+
+from gangplank import PrometheusModel
+from gangplank.pushgateway import (
+    SHARD_ENV_VARS,
+    PeriodicPusher,
+    default_grouping_key,
+    push_registry,
+)
+
+_BATCH_JOB_SCRIPT = """
+import sys
+
+import numpy as np
+import prometheus_client
+
+from gangplank import PrometheusModel
+
+
+class Model:
+    def predict(self, x, *args):
+        return x
+
+
+proxy = PrometheusModel(
+    Model(),
+    registry=prometheus_client.CollectorRegistry(),
+    pgw_addr=sys.argv[1],
+    push_interval=3600,
+)
+proxy.predict(np.ones((7, 2)))
+"""
+
+
+class _Identity:
+    def predict(self, x, *args):
+        return x
+
+
+def test_periodic_pushes_and_a_final_push_on_close(gateway):
+    registry = CollectorRegistry()
+    counter = Counter("events", "Events", registry=registry)
+    pusher = PeriodicPusher(
+        registry,
+        lambda r: push_registry(gateway.address, "job", r, grouping_key={"shard": "0"}),
+        0.05,
+        ignore_exceptions=False,
+    )
+    counter.inc()
+    deadline = time.monotonic() + 5
+    while len(gateway.pushes) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(gateway.pushes) >= 2
+    counter.inc(2)
+    assert pusher.close(timeout=5)
+    assert gateway.samples("events_total") == ["events_total 3.0"]
+    pushes = len(gateway.pushes)
+    # Closing again doesn't push again.
+    assert pusher.close(timeout=5)
+    assert len(gateway.pushes) == pushes
+    assert {path for _, path, _ in gateway.pushes} == {"/metrics/job/job/shard/0"}
+
+
+def test_close_pushes_the_final_metrics_of_a_model(gateway, monkeypatch):
+    for name in SHARD_ENV_VARS:
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("JOB_COMPLETION_INDEX", "2")
+    proxy = PrometheusModel(
+        _Identity(),
+        registry=prometheus_client.CollectorRegistry(),
+        pgw_addr=gateway.address,
+        push_job="batch",
+        push_interval=3600,
+    )
+    proxy.predict(np.ones((5, 2)))
+    proxy.close(timeout=5)
+    assert gateway.pushes[-1][1] == "/metrics/job/batch/shard/2"
+    assert gateway.samples("gangplank_predict_total") == ["gangplank_predict_total 5.0"]
+
+
+def test_the_final_metrics_are_pushed_at_exit(gateway):
+    src = os.path.join(os.path.dirname(__file__), os.pardir, "src")
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(src), GANGPLANK_SHARD="7")
+    subprocess.run(
+        [sys.executable, "-c", _BATCH_JOB_SCRIPT, gateway.address],
+        env=env,
+        check=True,
+        timeout=300,
+    )
+    assert gateway.pushes[-1][1] == "/metrics/job/gangplank_predict/shard/7"
+    assert gateway.samples("gangplank_predict_total") == ["gangplank_predict_total 7.0"]
+
+
+def test_the_default_grouping_key_identifies_the_shard(monkeypatch):
+    for name in SHARD_ENV_VARS:
+        monkeypatch.delenv(name, raising=False)
+    assert default_grouping_key() == {"shard": "0"}
+    monkeypatch.setenv("SLURM_ARRAY_TASK_ID", "4")
+    assert default_grouping_key() == {"shard": "4"}
+    monkeypatch.setenv("GANGPLANK_SHARD", "1")
+    assert default_grouping_key() == {"shard": "1"}
@@ -0,0 +1,82 @@
+import numpy as np
+import prometheus_client
+import pytest
+
+from gangplank import PrometheusModel
+from gangplank.sketch import QuantileSketch
+
+
+class _FixedModel:
+    def __init__(self, outputs):
+        self.outputs = outputs
+
+    def predict(self, x, *args):
+        return self.outputs
+
+
+def _profiled(outputs):
+    registry = prometheus_client.CollectorRegistry()
+    proxy = PrometheusModel(
+        _FixedModel(outputs), registry=registry, profile_outputs=True
+    )
+    proxy.predict(np.ones((4, 2)))
+    return registry
+
+
+def _class_count(registry, c):
+    return registry.get_sample_value("gangplank_predict_class_total", {"class": c})
+
+
+def test_quantiles_are_within_the_relative_accuracy():
+    values = np.random.default_rng(0).lognormal(size=100_000)
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    sketch.update(values)
+    qs = [0.01, 0.25, 0.5, 0.75, 0.99]
+    np.testing.assert_allclose(sketch.quantiles(qs), np.quantile(values, qs), rtol=0.02)
+    assert sketch.count == len(values)
+    assert sketch.sum == pytest.approx(values.sum())
+
+
+def test_negative_and_zero_values_are_ordered():
+    sketch = QuantileSketch()
+    sketch.update([-2.0, 0.0, 0.0, 3.0, np.nan])
+    assert sketch.count == 4
+    np.testing.assert_allclose(sketch.quantiles([0, 0.5, 1]), [-2, 0, 3], rtol=0.02)
+
+
+def test_merged_sketches_equal_a_sketch_of_all_the_values():
+    values = np.random.default_rng(1).normal(size=10_000)
+    merged, other, whole = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    merged.update(values[:3_000])
+    other.update(values[3_000:])
+    merged.merge(other)
+    whole.update(values)
+    np.testing.assert_array_equal(merged.ordered_counts(), whole.ordered_counts())
+    assert merged.count == whole.count
+    with pytest.raises(ValueError):
+        merged.merge(QuantileSketch(relative_accuracy=0.05))
+
+
+def test_classes_and_confidences_are_profiled():
+    y = np.array([[0.1, 0.9], [0.8, 0.2], [0.3, 0.7], [0.4, 0.6]])
+    registry = _profiled(y)
+    assert _class_count(registry, "0") == 1
+    assert _class_count(registry, "1") == 3
+    assert registry.get_sample_value("gangplank_predict_confidence_count") == 4
+    assert registry.get_sample_value(
+        "gangplank_predict_confidence", {"quantile": "0.5"}
+    ) == pytest.approx(0.7, rel=0.02)
+
+
+def test_a_single_column_is_a_binary_probability():
+    registry = _profiled(np.array([[0.1], [0.6], [0.9], [0.2]]))
+    assert _class_count(registry, "0") == 2
+    assert _class_count(registry, "1") == 2
+
+
+@pytest.mark.parametrize("second_shape", [(4, 3), (4, 1)])
+def test_the_first_of_several_outputs_is_profiled(second_shape):
+    first = np.eye(3)[[0, 1, 1, 2]]
+    registry = _profiled([first, np.zeros(second_shape)])
+    assert [_class_count(registry, c) for c in "012"] == [1, 2, 1]
+    assert registry.get_sample_value("gangplank_predict_confidence_count") == 4
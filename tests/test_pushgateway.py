@@ -0,0 +1,97 @@
+import threading
+import time
+
+import keras
+import numpy as np
+from prometheus_client import CollectorRegistry, Gauge
+
+from gangplank import TrainTestExporter
+from gangplank.pushgateway import AsyncPusher, push_registry
+
+
+def _registry(value):
+    registry = CollectorRegistry()
+    Gauge("value", "A value", registry=registry).set(value)
+    return registry
+
+
+def _value(snapshot):
+    (metric,) = snapshot.collect()
+    return metric.samples[0].value
+
+
+def _model():
+    model = keras.Sequential(
+        [keras.Input((4,)), keras.layers.Dense(2, activation="softmax")]
+    )
+    model.compile("adam", "sparse_categorical_crossentropy")
+    x = np.random.default_rng(0).random((64, 4), dtype=np.float32)
+    y = (x.sum(axis=1) > 2).astype(np.int32)
+    return model, x, y
+
+
+def test_pending_snapshots_are_coalesced():
+    release = threading.Event()
+    pushed = []
+
+    def push(snapshot):
+        release.wait()
+        pushed.append(_value(snapshot))
+
+    pusher = AsyncPusher(push)
+    pusher.submit(_registry(1))
+    # Wait for the first snapshot to be taken off the queue so that the others queue
+    # behind it.
+    while pusher._pending is not None:
+        time.sleep(0.001)
+    for value in (2, 3, 4):
+        pusher.submit(_registry(value))
+    release.set()
+    assert pusher.close(timeout=5)
+    assert pushed == [1, 4]
+
+
+def test_failed_push_is_retried(gateway):
+    gateway.failures = 2
+    pusher = AsyncPusher(
+        lambda registry: push_registry(gateway.address, "job", registry),
+        backoff=0.01,
+        ignore_exceptions=False,
+    )
+    pusher.submit(_registry(7))
+    assert pusher.close(timeout=5)
+    assert gateway.failures == 0
+    assert gateway.samples("value") == ["value 7.0"]
+
+
+def test_on_train_end_flushes_the_last_epoch(gateway):
+    gateway.latency = 0.2
+    model, x, y = _model()
+    exporter = TrainTestExporter(
+        gateway.address, "job", async_push=True, ignore_exceptions=False
+    )
+    model.fit(x, y, epochs=3, verbose=0, callbacks=[exporter])
+    # fit has returned so on_train_end has waited for the final push.
+    assert gateway.samples("gangplank_train_epochs_count") == [
+        "gangplank_train_epochs_count 3.0"
+    ]
+
+
+def test_async_epochs_do_not_wait_for_the_gateway(gateway):
+    gateway.latency = 0.3
+    epochs = 5
+    durations = {}
+    for async_push in (False, True):
+        model, x, y = _model()
+        # Compile the train function before timing.
+        model.fit(x, y, epochs=1, verbose=0)
+        exporter = TrainTestExporter(
+            gateway.address, "job", async_push=async_push, ignore_exceptions=False
+        )
+        start = time.perf_counter()
+        model.fit(x, y, epochs=epochs, verbose=0, callbacks=[exporter])
+        durations[async_push] = time.perf_counter() - start
+    # Synchronous pushes stall every epoch; asynchronous pushes are coalesced and at
+    # most one push is outstanding when training ends.
+    assert durations[False] >= epochs * gateway.latency
+    assert durations[True] < durations[False] - 2 * gateway.latency
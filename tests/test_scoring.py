@@ -0,0 +1,110 @@
+import threading
+
+import keras
+import numpy as np
+import prometheus_client
+import pytest
+
+from gangplank.scoring import BatchScorer
+
+
+@pytest.fixture(scope="module")
+def model():
+    inputs = keras.Input((4,))
+    return keras.Model(inputs, keras.layers.Dense(3, activation="softmax")(inputs))
+
+
+@pytest.fixture
+def x():
+    return np.random.default_rng(0).random((1000, 4), dtype=np.float32)
+
+
+def _scorer(model, batch_size=128):
+    return BatchScorer(
+        model,
+        batch_size=batch_size,
+        queue_size=2,
+        registry=prometheus_client.CollectorRegistry(),
+    )
+
+
+def _score(scorer, *args, **kwargs):
+    # Scores on another thread so that a pipeline that hangs fails the test.
+    result = {}
+
+    def run():
+        try:
+            result["outputs"] = scorer.score(*args, **kwargs)
+        except Exception as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=60)
+    assert not thread.is_alive(), "score() didn't return"
+    if "error" in result:
+        raise result["error"]
+    return result["outputs"]
+
+
+def _batches(x, batch_size, fail_at=None):
+    for i, start in enumerate(range(0, len(x), batch_size)):
+        if i == fail_at:
+            raise OSError("read failed")
+        yield x[start : start + batch_size]
+
+
+def test_a_memory_mapped_file_is_scored_to_a_file(model, x, tmp_path):
+    np.save(tmp_path / "x.npy", x)
+    scorer = _scorer(model)
+    outputs = _score(scorer, str(tmp_path / "x.npy"), str(tmp_path / "y.npy"))
+    expected = model.predict(x, verbose=0)
+    np.testing.assert_allclose(outputs, expected, rtol=1e-5)
+    np.testing.assert_allclose(np.load(tmp_path / "y.npy"), expected, rtol=1e-5)
+    assert scorer.rows._value.get() == len(x)
+
+
+def test_a_generator_of_batches_is_scored(model, x):
+    outputs = _score(_scorer(model), _batches(x, 100), num_rows=len(x))
+    np.testing.assert_allclose(outputs, model.predict(x, verbose=0), rtol=1e-5)
+
+
+def test_a_reader_error_is_raised(model, x):
+    with pytest.raises(OSError, match="read failed"):
+        _score(_scorer(model), _batches(x, 100, fail_at=3), num_rows=len(x))
+
+
+def test_a_model_error_is_raised(x):
+    class FailingModel:
+        calls = 0
+
+        def predict(self, x, **kwargs):
+            self.calls += 1
+            if self.calls == 3:
+                raise RuntimeError("predict failed")
+            return x
+
+    with pytest.raises(RuntimeError, match="predict failed"):
+        _score(_scorer(FailingModel()), x)
+
+
+def test_a_writer_error_is_raised(x):
+    class ChangingModel:
+        calls = 0
+
+        def predict(self, x, **kwargs):
+            # A later batch doesn't fit the output array that the first one shaped.
+            self.calls += 1
+            return x[:, :1] if self.calls == 1 else x
+
+    with pytest.raises(ValueError):
+        _score(_scorer(ChangingModel()), x)
+
+
+def test_num_rows_must_match_the_inputs(model, x):
+    with pytest.raises(ValueError, match="num_rows is required"):
+        _score(_scorer(model), _batches(x, 100))
+    with pytest.raises(ValueError, match="expected 1200 rows"):
+        _score(_scorer(model), _batches(x, 100), num_rows=1200)
+    with pytest.raises(ValueError, match="more than 800 rows"):
+        _score(_scorer(model), _batches(x, 100), num_rows=800)
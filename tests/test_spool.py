@@ -0,0 +1,105 @@
+import os
+
+from prometheus_client import CollectorRegistry, Gauge
+
+from gangplank.pushgateway import PushSpool, _destination, _encode_push
+
+
+def _registry(value):
+    registry = CollectorRegistry()
+    Gauge("value", "A value", registry=registry).set(value)
+    return registry
+
+
+def _spool(path, **kwargs):
+    metrics = CollectorRegistry()
+    return PushSpool(str(path), registry=metrics, **kwargs), metrics
+
+
+def _pushed(gateway):
+    # The group and value of every accepted push.
+    with gateway.lock:
+        pushes = list(gateway.pushes)
+    values = []
+    for _, path, body in pushes:
+        (line,) = [line for line in body.splitlines() if line.startswith("value ")]
+        values.append((path.rsplit("/", 1)[-1], float(line.split()[1])))
+    return values
+
+
+def _spool_pushes(gateway, spool, values):
+    gateway.failures = 1000
+    for value in values:
+        assert not spool.push(gateway.address, "job", _registry(value), {"g": "a"})
+    gateway.failures = 0
+
+
+def test_pushes_are_spooled_and_replayed_in_order(gateway, tmp_path):
+    spool, metrics = _spool(tmp_path / "spool", replay_batch_size=1)
+    _spool_pushes(gateway, spool, [1, 2, 3])
+    assert len(spool) == 3
+    assert metrics.get_sample_value("gangplank_push_spool_entries") == 3
+
+    spool.replay()
+    assert _pushed(gateway) == [("a", 1), ("a", 2), ("a", 3)]
+    assert len(spool) == 0
+    assert not os.path.exists(tmp_path / "spool")
+    assert spool.push(gateway.address, "job", _registry(4), {"g": "a"})
+    assert _pushed(gateway)[-1] == ("a", 4)
+
+
+def test_a_push_replays_at_most_one_batch(gateway, tmp_path):
+    spool, _ = _spool(tmp_path / "spool", replay_batch_size=2)
+    gateway.failures = 1000
+    for value in range(5):
+        spool.push(gateway.address, "job", _registry(value), {"g": str(value)})
+    gateway.failures = 0
+
+    # The new push queues behind the three pushes that are still waiting.
+    assert not spool.push(gateway.address, "job", _registry(5), {"g": "5"})
+    assert _pushed(gateway) == [("0", 0), ("1", 1)]
+    assert len(spool) == 4
+    spool.replay()
+    assert [value for _, value in _pushed(gateway)] == [0, 1, 2, 3, 4, 5]
+
+
+def test_a_spool_left_by_a_dead_process_is_replayed(gateway, tmp_path):
+    path = tmp_path / "spool"
+    spool, _ = _spool(path, replay_batch_size=1)
+    _spool_pushes(gateway, spool, [1, 2, 3])
+    # Replay the first push, which moves the offset past it, and spool a fourth.
+    assert not spool.push(gateway.address, "job", _registry(4), {"g": "a"})
+    assert _pushed(gateway) == [("a", 1)]
+    # The process dies while writing a fifth push.
+    size = os.path.getsize(path)
+    record = _encode_push(_destination(gateway.address, "job", None), 0.0, _registry(5))
+    with open(path, "ab") as f:
+        f.write(record[: len(record) // 2])
+    del spool
+
+    spool, metrics = _spool(path, replay_batch_size=1)
+    assert os.path.getsize(path) == size
+    assert len(spool) == 3
+    assert metrics.get_sample_value("gangplank_push_spool_entries") == 3
+    spool.replay()
+    assert _pushed(gateway) == [("a", 1), ("a", 2), ("a", 3), ("a", 4)]
+
+
+def test_compaction_keeps_the_newest_push_per_group_under_max_bytes(gateway, tmp_path):
+    destination = _destination(gateway.address, "job", {"g": "a"})
+    record_size = len(_encode_push(destination, 0.0, _registry(0)))
+    spool, metrics = _spool(
+        tmp_path / "spool", max_bytes=int(3.5 * record_size), replay_batch_size=1
+    )
+    gateway.failures = 1000
+    for value, group in enumerate("abacd"):
+        spool.push(gateway.address, "job", _registry(value), {"g": group})
+    gateway.failures = 0
+
+    # Adding c superseded the first push to a; adding d dropped the oldest push, to b.
+    assert metrics.get_sample_value("gangplank_push_spool_dropped_total") == 2
+    assert len(spool) == 3
+    assert os.path.getsize(tmp_path / "spool") == 3 * record_size
+    assert metrics.get_sample_value("gangplank_push_spool_bytes") == 3 * record_size
+    spool.replay()
+    assert _pushed(gateway) == [("a", 2), ("c", 3), ("d", 4)]
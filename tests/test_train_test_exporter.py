@@ -0,0 +1,171 @@
+import time
+
+import keras
+import numpy as np
+import pytest
+
+from gangplank import TrainTestExporter
+from gangplank.train_test_exporter import _TimedTrainFunction
+
+
+def _exporter():
+    return TrainTestExporter("localhost:9091", "job")
+
+
+def _value(exporter, name):
+    return exporter.registry.get_sample_value(name)
+
+
+def test_gauges_are_bound_once_and_rebound_for_new_metrics():
+    exporter = _exporter()
+    exporter._set_metric_gauges("gangplank_train_", {"loss": 1.0, "note": "text"})
+    bound = exporter._bound_gauges["gangplank_train_"]
+    exporter._set_metric_gauges("gangplank_train_", {"loss": 0.5, "note": "text"})
+    assert exporter._bound_gauges["gangplank_train_"] is bound
+    assert _value(exporter, "gangplank_train_loss") == 0.5
+    assert _value(exporter, "gangplank_train_note") is None
+
+    logs = {"loss": 0.25, "note": "text", "accuracy": 0.9}
+    exporter._set_metric_gauges("gangplank_train_", logs)
+    assert _value(exporter, "gangplank_train_loss") == 0.25
+    assert _value(exporter, "gangplank_train_accuracy") == 0.9
+
+    # A key that replaces another, leaving the number of keys unchanged.
+    logs = {"loss": 0.125, "note": "text", "val_loss": 0.5}
+    exporter._set_metric_gauges("gangplank_train_", logs)
+    assert _value(exporter, "gangplank_train_loss") == 0.125
+    assert _value(exporter, "gangplank_train_val_loss") == 0.5
+
+
+def test_parameter_count_is_cached_per_model():
+    model = keras.Sequential([keras.Input((3,)), keras.layers.Dense(2)])
+    exporter = _exporter()
+    exporter.set_model(model)
+    calls = []
+    count_params = model.count_params
+
+    def counting_count_params():
+        calls.append(1)
+        return count_params()
+
+    model.count_params = counting_count_params
+    assert exporter._count_params() == 8
+    assert exporter._count_params() == 8
+    assert len(calls) == 1
+
+    other = keras.Sequential([keras.Input((3,)), keras.layers.Dense(1)])
+    exporter.set_model(other)
+    assert exporter._count_params() == 4
+
+
+class _SlowBatches(keras.utils.PyDataset):
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+        rng = np.random.default_rng(0)
+        self.x = rng.random((8, 16, 4), dtype=np.float32)
+        self.y = rng.random((8, 16, 1), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.x)
+
+    def __getitem__(self, index):
+        time.sleep(self.delay)
+        return self.x[index], self.y[index]
+
+
+def test_step_metrics_split_training_time_into_data_wait_and_compute(gateway):
+    model = keras.Sequential([keras.Input((4,)), keras.layers.Dense(1)])
+    model.compile("sgd", "mse")
+    exporter = TrainTestExporter(
+        gateway.address,
+        "job",
+        step_metrics=True,
+        batch_size=16,
+        ignore_exceptions=False,
+    )
+    model.fit(_SlowBatches(0.02), epochs=2, verbose=0, callbacks=[exporter])
+
+    assert _value(exporter, "gangplank_train_step_seconds_count") == 16
+    assert _value(exporter, "gangplank_train_data_wait_ratio") > 0.5
+    assert _value(exporter, "gangplank_train_samples_per_second") > 0
+    assert gateway.samples("gangplank_train_data_wait_seconds_total")
+    # The train function is put back once training ends.
+    assert not isinstance(model.train_function, _TimedTrainFunction)
+
+
+def _batch_exporter(gateway, **kwargs):
+    return TrainTestExporter(
+        gateway.address,
+        "job",
+        batch_metrics=True,
+        ignore_exceptions=False,
+        **kwargs,
+    )
+
+
+def test_batch_metrics_are_pushed_every_n_batches(gateway):
+    exporter = _batch_exporter(gateway, batch_push_every=3)
+    exporter.on_train_begin({})
+    for batch in range(7):
+        exporter.on_train_batch_end(batch, {"loss": float(batch)})
+    assert len(gateway.pushes) == 2
+    assert gateway.samples("gangplank_train_batches_count") == [
+        "gangplank_train_batches_count 6.0"
+    ]
+    assert gateway.samples("gangplank_train_batch_loss") == [
+        "gangplank_train_batch_loss 5.0"
+    ]
+
+
+def test_batch_push_interval_starts_when_training_begins(gateway):
+    exporter = _batch_exporter(gateway, batch_push_interval=0.2)
+    # Time spent before training must not count towards the first interval.
+    time.sleep(0.3)
+    exporter.on_train_begin({})
+    exporter.on_train_batch_end(0, {"loss": 1.0})
+    assert not gateway.pushes
+
+    time.sleep(0.3)
+    exporter.on_train_batch_end(1, {"loss": 0.5})
+    exporter.on_train_batch_end(2, {"loss": 0.25})
+    assert len(gateway.pushes) == 1
+    assert gateway.samples("gangplank_train_batch_loss") == [
+        "gangplank_train_batch_loss 0.5"
+    ]
+
+
+def test_a_train_function_without_an_iterator_is_passed_through():
+    # The torch backend passes a list of batches, not an iterator.
+    model = keras.Sequential([keras.Input((4,)), keras.layers.Dense(1)])
+    exporter = _exporter()
+    wrapper = _TimedTrainFunction(lambda data: data[0], model, exporter)
+    model.train_function = wrapper
+    exporter._step_begun = True
+    assert wrapper(["batch"]) == "batch"
+    assert model.train_function is wrapper
+    assert exporter._step_read_time == 0.0
+
+
+@pytest.mark.benchmark
+def test_benchmark_per_epoch_gauge_updates():
+    logs = {f"metric_{i}": float(i) for i in range(20)}
+    cached = _exporter()
+    uncached = _exporter()
+    n = 10_000
+
+    start = time.perf_counter()
+    for _ in range(n):
+        cached._set_metric_gauges("gangplank_train_", logs)
+    cached_us = (time.perf_counter() - start) / n * 1e6
+
+    # The cost without caching: the logs are rescanned and the gauges looked up by
+    # name on every epoch.
+    start = time.perf_counter()
+    for _ in range(n):
+        for k, gauge in uncached._bind_gauges("gangplank_train_", logs):
+            gauge.set(logs[k])
+    uncached_us = (time.perf_counter() - start) / n * 1e6
+
+    print(f"\n20 metrics: cached {cached_us:.1f} us, uncached {uncached_us:.1f} us")
+    assert cached_us < uncached_us
@@ -0,0 +1,97 @@
+import tracemalloc
+
+import keras
+import numpy as np
+import prometheus_client
+import pytest
+
+from gangplank import Drift, PrometheusModel
+
+
+class _Identity:
+    def predict(self, x, *args):
+        return x
+
+
+def test_hooks_get_read_only_views_without_copies():
+    seen = []
+
+    def drift(x, y):
+        seen.append((x, y))
+        return Drift()
+
+    proxy = PrometheusModel(
+        _Identity(),
+        registry=prometheus_client.CollectorRegistry(),
+        get_drift_metrics_func=drift,
+    )
+    x = np.arange(12, dtype=np.float32).reshape(6, 2)
+    y = proxy.predict(x)
+    assert y is x
+    ((x_view, y_view),) = seen
+    assert np.shares_memory(x_view, x) and np.shares_memory(y_view, x)
+    assert not x_view.flags.writeable and not y_view.flags.writeable
+    assert x.flags.writeable
+
+
+def test_unsampled_requests_build_no_views(monkeypatch):
+    import gangplank.prometheus_model as prometheus_model
+
+    views = []
+    readonly_view = prometheus_model._readonly_view
+
+    def counting_readonly_view(a):
+        views.append(a)
+        return readonly_view(a)
+
+    monkeypatch.setattr(prometheus_model, "_readonly_view", counting_readonly_view)
+    proxy = PrometheusModel(
+        _Identity(),
+        registry=prometheus_client.CollectorRegistry(),
+        get_drift_metrics_func=lambda x, y: Drift(),
+        drift_sample_rate=10,
+    )
+    for _ in range(100):
+        proxy.predict(np.zeros((2, 2)))
+    # An input and an output view for each of the 10 sampled requests.
+    assert len(views) == 20
+
+
+def _allocations(func, n=20):
+    for _ in range(3):
+        func()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    for _ in range(n):
+        func()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak - base, (current - base) / n
+
+
+@pytest.mark.benchmark
+def test_benchmark_no_extra_allocations_per_request():
+    inputs = keras.Input((64,))
+    model = keras.Model(inputs, keras.layers.Dense(1000)(inputs))
+    proxy = PrometheusModel(
+        model,
+        registry=prometheus_client.CollectorRegistry(),
+        get_drift_metrics_func=lambda x, y: Drift(),
+    )
+    x = np.random.default_rng(0).random((512, 64), dtype=np.float32)
+    output_bytes = 512 * 1000 * 4
+
+    raw_peak, raw_net = _allocations(
+        lambda: model.predict(x, batch_size=512, verbose=0)
+    )
+    proxy_peak, proxy_net = _allocations(
+        lambda: proxy.predict(x, batch_size=512, verbose=0)
+    )
+    print(
+        f"\npeak MB: raw {raw_peak / 1e6:.2f}, proxy {proxy_peak / 1e6:.2f}; "
+        f"net bytes/request: raw {raw_net:.0f}, proxy {proxy_net:.0f}"
+    )
+    # A copy of the outputs for the hooks would add a whole output to the peak.
+    assert proxy_peak < raw_peak + output_bytes / 4
+    assert proxy_net < raw_net + 1024